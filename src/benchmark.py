@@ -0,0 +1,319 @@
+"""Offline load test for the email verification flow.
+
+Drives VerificationCommands with fake Discord objects against a local SMTP
+sink and reports throughput, latency percentiles and event-loop lag:
+
+    python benchmark.py --users 500 --concurrency 100
+
+No Discord token, SMTP account or database is needed.
+"""
+import argparse
+import asyncio
+import email
+import os
+import re
+import socket
+import threading
+import time
+
+CODE_PATTERN = re.compile(r'Dein Verifizierungscode lautet: (\w+)')
+RECIPIENT_PATTERN = re.compile(r'<([^>]+)>')
+
+class SMTPSink:
+    """Minimal SMTP server on its own thread that remembers the last code per recipient"""
+
+    def __init__(self):
+        self.codes = {}
+        self.messages = 0
+        self._lock = threading.Lock()
+        self._ready = threading.Event()
+        self._loop = None
+        self.port = None
+
+    def start(self) -> None:
+        with socket.socket() as probe:
+            probe.bind(("127.0.0.1", 0))
+            self.port = probe.getsockname()[1]
+        threading.Thread(target=self._serve, name="smtp-sink", daemon=True).start()
+        self._ready.wait()
+
+    def stop(self) -> None:
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._loop.stop)
+
+    def code_for(self, email: str):
+        with self._lock:
+            return self.codes.get(email)
+
+    def _serve(self) -> None:
+        self._loop = asyncio.new_event_loop()
+        server = self._loop.run_until_complete(asyncio.start_server(self._handle, "127.0.0.1", self.port))
+        self._ready.set()
+        try:
+            self._loop.run_forever()
+        finally:
+            server.close()
+
+    async def _handle(self, reader, writer) -> None:
+        def reply(line: str):
+            writer.write(f"{line}\r\n".encode())
+
+        reply("220 localhost benchmark sink")
+        recipients = []
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                command = line.decode(errors="replace").strip()
+                verb = command[:4].upper()
+                if verb in ("EHLO", "HELO"):
+                    reply("250 localhost")
+                elif verb == "MAIL":
+                    recipients = []
+                    reply("250 OK")
+                elif verb == "RCPT":
+                    recipients.extend(RECIPIENT_PATTERN.findall(command))
+                    reply("250 OK")
+                elif verb == "DATA":
+                    reply("354 End data with <CR><LF>.<CR><LF>")
+                    data = await reader.readuntil(b"\r\n.\r\n")
+                    message = email.message_from_bytes(data[:-5])
+                    body = message.get_payload(decode=True).decode(errors="replace")
+                    match = CODE_PATTERN.search(body)
+                    with self._lock:
+                        self.messages += 1
+                        for recipient in recipients:
+                            if match:
+                                self.codes[recipient] = match.group(1)
+                    reply("250 OK")
+                elif verb == "QUIT":
+                    reply("221 Bye")
+                    await writer.drain()
+                    break
+                else:  # NOOP, RSET
+                    reply("250 OK")
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+class FakeRole:
+    def __init__(self, role_id: int, name: str):
+        self.id = role_id
+        self.name = name
+
+class FakeMember:
+    def __init__(self, user_id: int):
+        self.id = user_id
+        self.roles = []
+
+    async def add_roles(self, *roles, reason=None):
+        self.roles.extend(roles)
+
+class FakeChannel:
+    def __init__(self, channel_id: int, name: str):
+        self.id = channel_id
+        self.name = name
+        self.sent = 0
+
+    async def send(self, content=None, **kwargs):
+        self.sent += 1
+
+class FakeGuild:
+    def __init__(self, guild_id: int, log_channel_name: str, role_name: str):
+        self.id = guild_id
+        self.roles = [FakeRole(1, role_name)]
+        self.channels = [FakeChannel(1, log_channel_name)]
+        self.members = {}
+
+    def get_channel(self, channel_id: int):
+        return next((channel for channel in self.channels if channel.id == channel_id), None)
+
+    def get_role(self, role_id: int):
+        return next((role for role in self.roles if role.id == role_id), None)
+
+    def get_member(self, user_id: int):
+        return self.members.get(user_id)
+
+    async def fetch_member(self, user_id: int):
+        member = self.members[user_id] = FakeMember(user_id)
+        return member
+
+class FakeBot:
+    def __init__(self, guild: FakeGuild):
+        self.guild = guild
+        self.guilds = [guild]
+
+    def get_guild(self, guild_id: int):
+        return self.guild if guild_id == self.guild.id else None
+
+    def get_channel(self, channel_id: int):
+        return None
+
+    async def wait_until_ready(self):
+        pass
+
+class FakeUser:
+    def __init__(self, user_id: int):
+        self.id = user_id
+
+    def __str__(self):
+        return f"bench-user-{self.id}"
+
+class FakeContext:
+    """Stand-in for commands.Context that signals when the delivery report arrives"""
+    prefix = ">"
+    guild = None
+
+    def __init__(self, bot, user_id: int):
+        self.bot = bot
+        self.author = FakeUser(user_id)
+        self.replies = []
+        self.delivered = asyncio.Event()
+
+    async def send(self, content=None, **kwargs):
+        self.replies.append(content)
+        if content and ("✅" in content or "Fehler" in content or "ausgelastet" in content):
+            self.delivered.set()
+
+def student_email(index: int) -> str:
+    letters = ""
+    index += 1
+    while index:
+        index, rest = divmod(index - 1, 26)
+        letters = chr(ord("a") + rest) + letters
+    return f"bench{letters}00@thu.de"
+
+def percentile(values: list, fraction: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+async def monitor_loop_lag(samples: list, stop: asyncio.Event, interval: float = 0.01) -> None:
+    loop = asyncio.get_running_loop()
+    while not stop.is_set():
+        started = loop.time()
+        await asyncio.sleep(interval)
+        samples.append(loop.time() - started - interval)
+
+async def run_user(handler, bot, sink, index: int, results: dict, semaphore: asyncio.Semaphore) -> None:
+    async with semaphore:
+        user_id = 10**17 + index
+        address = student_email(index)
+        ctx = FakeContext(bot, user_id)
+
+        started = time.perf_counter()
+        await handler.verify_email(ctx, address)
+        results['verify_command'].append(time.perf_counter() - started)
+        await asyncio.wait_for(ctx.delivered.wait(), 60)
+        results['verify_delivered'].append(time.perf_counter() - started)
+
+        code = sink.code_for(address)
+        if code is None:
+            results['failed'] += 1
+            return
+        confirm_started = time.perf_counter()
+        await handler.confirm_email(ctx, code)
+        results['confirm'].append(time.perf_counter() - confirm_started)
+        results['flow'].append(time.perf_counter() - started)
+        if "erfolgreich verifiziert" in (ctx.replies[-1] or ""):
+            results['verified'] += 1
+        else:
+            results['failed'] += 1
+
+async def run_benchmark(users: int, concurrency: int) -> dict:
+    # Imported late so the environment set up in main() is picked up by Config
+    from cogs.email_verification.commands import VerificationCommands
+    from cogs.email_verification.config import Config
+    from cogs.email_verification.metrics import VERIFY_STAGE_SECONDS
+
+    guild = FakeGuild(int(Config.GUILD_ID), Config.LOG_CHANNEL_NAME, Config.VERIFIED_ROLE_NAME)
+    bot = FakeBot(guild)
+    handler = VerificationCommands(bot)
+    await handler.start()
+
+    results = {'verify_command': [], 'verify_delivered': [], 'confirm': [], 'flow': [], 'verified': 0, 'failed': 0}
+    lag_samples = []
+    stop = asyncio.Event()
+    lag_task = asyncio.create_task(monitor_loop_lag(lag_samples, stop))
+    semaphore = asyncio.Semaphore(concurrency)
+
+    started = time.perf_counter()
+    outcomes = await asyncio.gather(
+        *(run_user(handler, bot, SINK, i, results, semaphore) for i in range(users)),
+        return_exceptions=True
+    )
+    elapsed = time.perf_counter() - started
+    results['failed'] += sum(isinstance(outcome, Exception) for outcome in outcomes)
+
+    stop.set()
+    await lag_task
+    await handler.stop()
+
+    results['elapsed'] = elapsed
+    results['loop_lag'] = lag_samples
+    results['log_messages'] = guild.channels[0].sent
+    results['stages'] = {
+        values[0]: child.sum / max(1, sum(child.counts))
+        for values, child in VERIFY_STAGE_SECONDS._children.items()
+    }
+    return results
+
+def print_report(results: dict, users: int, concurrency: int) -> None:
+    def row(name: str, values: list):
+        ms = [v * 1000 for v in values]
+        print(f"  {name:<18} p50 {percentile(ms, 0.5):8.2f} ms   p99 {percentile(ms, 0.99):8.2f} ms   "
+              f"max {max(ms, default=0):8.2f} ms")
+
+    print(f"Users: {users}, concurrency: {concurrency}, SMTP messages: {SINK.messages}")
+    print(f"Verified: {results['verified']}, failed: {results['failed']}, "
+          f"log channel messages: {results['log_messages']}")
+    print(f"Elapsed: {results['elapsed']:.2f}s, throughput: {results['verified'] / results['elapsed']:.1f} verifications/s")
+    print("Latency:")
+    row("verify (command)", results['verify_command'])
+    row("verify (delivered)", results['verify_delivered'])
+    row("confirm", results['confirm'])
+    row("full flow", results['flow'])
+    row("event-loop lag", results['loop_lag'])
+    print("Mean verify stage time:")
+    for stage, mean in sorted(results['stages'].items()):
+        print(f"  {stage:<18} {mean * 1000:8.3f} ms")
+
+SINK = SMTPSink()
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the verify -> confirm flow offline")
+    parser.add_argument("--users", type=int, default=200, help="number of simulated users")
+    parser.add_argument("--concurrency", type=int, default=50, help="users verifying at the same time")
+    args = parser.parse_args()
+
+    SINK.start()
+    os.environ.update({
+        'SMTP_SERVER': '127.0.0.1',
+        'SMTP_PORT': str(SINK.port),
+        'SMTP_STARTTLS': 'false',
+        'SENDER_EMAIL': 'bench@localhost',
+        'EMAIL_PASSWORD': '',
+        'GUILD_ID': '1',
+        'GUILD_CONFIG_PATH': os.path.join('.', 'data', 'bench_guilds.json'),
+        'STORAGE_BACKEND': 'none',
+        'METRICS_ENABLED': 'false',
+        'BULK_IMPORT_DIR': os.path.join('.', 'data', 'bench_bulk_imports'),
+        'OUTBOX_PATH': os.path.join('.', 'data', 'bench_outbox.db'),
+        'AUDIT_PATH': os.path.join('.', 'data', 'bench_audit.db'),
+        'VERIFY_USER_LIMIT': str(10**9),
+        'VERIFY_EMAIL_LIMIT': str(10**9),
+        'VERIFY_GLOBAL_LIMIT': str(10**9),
+    })
+
+    try:
+        results = asyncio.run(run_benchmark(args.users, args.concurrency))
+    finally:
+        SINK.stop()
+    print_report(results, args.users, args.concurrency)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,181 @@
+import asyncio
+import json
+import logging
+import re
+import sqlite3
+import time
+from typing import Optional
+import discord
+from .config import Config
+from .verification_storage import SQLiteBackend, VerificationStorage
+
+logger = logging.getLogger('email_verification')
+
+SCHEMA = (
+    """CREATE TABLE IF NOT EXISTS audit_events (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        created_at REAL NOT NULL,
+        event TEXT NOT NULL,
+        user_id INTEGER,
+        email TEXT,
+        description TEXT,
+        fields TEXT NOT NULL,
+        guild_id INTEGER
+    )""",
+    "CREATE INDEX IF NOT EXISTS idx_audit_created_at ON audit_events (created_at)",
+)
+
+# Created once the guild_id column is sure to exist; they replace the unscoped ones
+INDEXES = (
+    "DROP INDEX IF EXISTS idx_audit_user",
+    "DROP INDEX IF EXISTS idx_audit_event",
+    "CREATE INDEX IF NOT EXISTS idx_audit_guild_user ON audit_events (guild_id, user_id, created_at)",
+    "CREATE INDEX IF NOT EXISTS idx_audit_guild_event ON audit_events (guild_id, event, created_at)",
+)
+
+# Log embeds name the user as "name (id)"
+USER_FIELD_PATTERN = re.compile(r'\((\d{15,20})\)$')
+
+class AuditLog:
+    """Append-only SQLite copy of every log channel event.
+
+    Rows are only ever inserted, and deleted once they are older than
+    AUDIT_RETENTION_DAYS; the purge runs at startup and every PURGE_EVERY
+    records. Every event belongs to the guild whose log channel it went to,
+    and queries only ever look at one guild. Addresses are stored as the
+    same hash VerificationStorage uses and verification codes are left out,
+    so the log can tell events of one address apart but not reveal it.
+    Queries run on a
+    single-connection SQLiteBackend thread, so a slow disk never holds up
+    the event loop.
+    """
+    PURGE_EVERY = 1000
+
+    def __init__(self, path: str = Config.AUDIT_PATH, retention_days: int = Config.AUDIT_RETENTION_DAYS,
+                 default_guild_id: Optional[int] = None):
+        self.path = path
+        self.default_guild_id = default_guild_id
+        self.retention = retention_days * 24 * 3600
+        self.db = SQLiteBackend(path, pool_size=1)
+        self._pending: list[tuple] = []
+        self._flushes: set[asyncio.Task] = set()
+        self._since_purge = 0
+
+    async def setup(self) -> None:
+        def create(conn):
+            for statement in SCHEMA:
+                conn.execute(statement)
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(audit_events)").fetchall()}
+            if "guild_id" not in columns:
+                # Events from before multi-guild support all went to the default guild
+                conn.execute("ALTER TABLE audit_events ADD COLUMN guild_id INTEGER")
+                conn.execute("UPDATE audit_events SET guild_id = ?", (self.default_guild_id,))
+            for statement in INDEXES:
+                conn.execute(statement)
+            # Rows written before addresses were hashed
+            plain = conn.execute(
+                "SELECT id, email, fields FROM audit_events WHERE email LIKE '%@%' OR fields LIKE '%Code\"%'"
+            ).fetchall()
+            conn.conn.executemany(
+                "UPDATE audit_events SET email = ?, fields = ? WHERE id = ?",
+                [(*self._redact(email, json.loads(fields)), row_id) for row_id, email, fields in plain]
+            )
+
+        await self.db.run(create)
+        await self.purge()
+
+    def record(self, embed: discord.Embed, guild_id: Optional[int] = None) -> None:
+        """Store the event a log embed describes.
+
+        Events logged in the same event loop iteration are written together
+        in one transaction right after it.
+        """
+        fields = {field.name: field.value for field in embed.fields}
+        match = USER_FIELD_PATTERN.search(fields.get("User", ""))
+        self.record_event(int(match.group(1)) if match else None, embed.title or "", fields.get("Email"),
+                          embed.description, fields, guild_id,
+                          embed.timestamp.timestamp() if embed.timestamp else None)
+
+    def record_event(self, user_id: Optional[int], event: str, email: Optional[str] = None,
+                     description: Optional[str] = None, fields: Optional[dict] = None,
+                     guild_id: Optional[int] = None, created_at: Optional[float] = None) -> None:
+        """Store an event of a user that has no log embed of its own, e.g. one of a batch"""
+        email, fields = self._redact(email, fields or {})
+        self._pending.append((time.time() if created_at is None else created_at, event, user_id, email,
+                              description, fields, guild_id))
+        if len(self._pending) == 1:
+            # Starts on the next loop iteration, after the other records of this one
+            task = asyncio.create_task(self.flush())
+            self._flushes.add(task)
+            task.add_done_callback(self._flushes.discard)
+
+    @staticmethod
+    def _redact(email: Optional[str], fields: dict) -> tuple[Optional[str], str]:
+        """Hashed address and the fields as JSON, without addresses in plain text or codes"""
+        fields = {name: value for name, value in fields.items() if not name.endswith("Code")}
+        if fields.get("Email") and "@" in fields["Email"]:
+            fields["Email"] = VerificationStorage.hash_email(fields["Email"])
+        if email and "@" in email:
+            email = VerificationStorage.hash_email(email)
+        return email, json.dumps(fields, ensure_ascii=False)
+
+    async def flush(self) -> None:
+        rows, self._pending = self._pending, []
+        if not rows:
+            return
+
+        def insert(conn):
+            conn.conn.executemany(
+                "INSERT INTO audit_events (created_at, event, user_id, email, description, fields, guild_id) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                rows
+            )
+
+        try:
+            await self.db.run(insert)
+        except sqlite3.Error as e:
+            logger.error(f"Failed to write {len(rows)} audit events: {e}")
+            return
+        self._since_purge += len(rows)
+        if self._since_purge >= self.PURGE_EVERY:
+            await self.purge()
+
+    async def purge(self) -> int:
+        self._since_purge = 0
+
+        def purge(conn):
+            return conn.execute(
+                "DELETE FROM audit_events WHERE created_at < ?", (time.time() - self.retention,)
+            ).rowcount
+
+        return await self.db.run(purge)
+
+    async def event_counts(self, guild_id: int, since: float, until: Optional[float] = None) -> list[tuple[str, int]]:
+        """(event, count) of a guild between since and until, most frequent first"""
+        def count(conn):
+            return conn.execute(
+                "SELECT event, COUNT(*) FROM audit_events "
+                "WHERE guild_id = ? AND created_at >= ? AND created_at < ? "
+                "GROUP BY event ORDER BY COUNT(*) DESC",
+                (guild_id, since, time.time() if until is None else until)
+            ).fetchall()
+
+        return await self.db.run(count)
+
+    async def user_timeline(self, guild_id: int, user_id: int,
+                            limit: int = 25) -> list[tuple[float, str, Optional[str], Optional[str]]]:
+        """(created_at, event, email, description) of a user's latest events in a guild, oldest first"""
+        def load(conn):
+            return conn.execute(
+                "SELECT created_at, event, email, description FROM audit_events "
+                "WHERE guild_id = ? AND user_id = ? ORDER BY created_at DESC LIMIT ?",
+                (guild_id, user_id, limit)
+            ).fetchall()
+
+        rows = await self.db.run(load)
+        return rows[::-1]
+
+    async def close(self) -> None:
+        await asyncio.gather(*self._flushes, return_exceptions=True)
+        await self.flush()
+        await self.db.close()
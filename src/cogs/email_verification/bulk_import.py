@@ -0,0 +1,226 @@
+import asyncio
+import json
+import logging
+import os
+import re
+import secrets
+import time
+from dataclasses import asdict, dataclass, field
+from typing import Optional
+import discord
+from .config import Config
+from .utils import VerificationUtils
+
+logger = logging.getLogger('email_verification')
+
+USER_ID_PATTERN = re.compile(r'\b\d{15,20}\b')
+
+def parse_user_ids(text: str) -> list[int]:
+    """All distinct Discord IDs in text, in order of appearance"""
+    return list(dict.fromkeys(int(match) for match in USER_ID_PATTERN.findall(text)))
+
+@dataclass
+class BulkImportState:
+    job_id: str
+    user_ids: list[int]
+    admin: str
+    channel_id: int
+    position: int = 0
+    progress_message_id: Optional[int] = None
+    guild_id: Optional[int] = None  # None in checkpoints from before multi-guild support
+    counts: dict = field(default_factory=lambda: {'assigned': 0, 'already_verified': 0, 'not_found': 0, 'failed': 0})
+
+class BulkImportJob:
+    """Assigns the Verified role to a list of users at a fixed pace.
+
+    Progress is checkpointed to disk so a job interrupted by a crash or a
+    restart continues where it stopped. Only one summary is logged at the end.
+    """
+
+    def __init__(self, bot, guilds, state: BulkImportState):
+        self.bot = bot
+        self.resolver = guilds.resolve(state.guild_id)
+        self.state = state
+        self.path = os.path.join(Config.BULK_IMPORT_DIR, f"{state.job_id}.json")
+        self._last_progress = 0.0
+
+    @classmethod
+    def create(cls, bot, guilds, user_ids: list[int], admin: str, channel_id: int, guild_id: int) -> "BulkImportJob":
+        return cls(bot, guilds, BulkImportState(secrets.token_hex(4), user_ids, admin, channel_id, guild_id=guild_id))
+
+    @classmethod
+    def load(cls, bot, guilds, path: str) -> "BulkImportJob":
+        with open(path, encoding='utf-8') as f:
+            return cls(bot, guilds, BulkImportState(**json.load(f)))
+
+    @property
+    def total(self) -> int:
+        return len(self.state.user_ids)
+
+    def _write_checkpoint(self) -> None:
+        os.makedirs(Config.BULK_IMPORT_DIR, exist_ok=True)
+        tmp = f"{self.path}.tmp"
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(asdict(self.state), f)
+        os.replace(tmp, self.path)
+
+    async def checkpoint(self) -> None:
+        await asyncio.to_thread(self._write_checkpoint)
+
+    def progress_text(self) -> str:
+        counts = self.state.counts
+        return (f"Import `{self.state.job_id}`: {self.state.position}/{self.total} bearbeitet "
+                f"({counts['assigned']} zugewiesen, {counts['already_verified']} bereits verifiziert, "
+                f"{counts['not_found']} nicht gefunden, {counts['failed']} fehlgeschlagen)")
+
+    async def report_progress(self, force: bool = False) -> None:
+        """Edit the progress message, at most every few seconds"""
+        now = time.monotonic()
+        if not force and now - self._last_progress < Config.BULK_IMPORT_PROGRESS_INTERVAL:
+            return
+        self._last_progress = now
+        channel = self.bot.get_channel(self.state.channel_id)
+        if channel is None:
+            return
+        try:
+            if self.state.progress_message_id is not None:
+                await channel.get_partial_message(self.state.progress_message_id).edit(content=self.progress_text())
+            else:
+                message = await channel.send(self.progress_text())
+                self.state.progress_message_id = message.id
+        except discord.HTTPException as e:
+            logger.warning(f"Failed to update bulk import progress: {e}")
+
+    async def _assign(self, user_id: int) -> str:
+        member = await self.resolver.get_member(user_id)
+        if member is None:
+            return 'not_found'
+        role = self.resolver.verified_role()
+        if role is None:
+            raise RuntimeError("Verified role not found")
+        if role in member.roles:
+            return 'already_verified'
+        await member.add_roles(role, reason=f"Bulk import {self.state.job_id} by {self.state.admin}")
+        self.resolver.forget_member(user_id)
+        return 'assigned'
+
+    async def run(self) -> None:
+        await self.checkpoint()
+        await self.report_progress(force=True)
+        interval = 1 / Config.BULK_IMPORT_RATE
+        while self.state.position < self.total:
+            user_id = self.state.user_ids[self.state.position]
+            started = time.monotonic()
+            try:
+                outcome = await self._assign(user_id)
+            except discord.RateLimited as e:
+                # Only raised when discord.py refuses to wait that long itself
+                logger.warning(f"Bulk import {self.state.job_id} rate limited, waiting {e.retry_after:.0f}s")
+                await asyncio.sleep(e.retry_after)
+                continue
+            except RuntimeError as e:
+                logger.error(f"Bulk import {self.state.job_id} aborted: {e}")
+                break
+            except discord.HTTPException as e:
+                logger.warning(f"Bulk import {self.state.job_id} failed for {user_id}: {e}")
+                outcome = 'failed'
+            self.state.counts[outcome] += 1
+            self.state.position += 1
+
+            if self.state.position % Config.BULK_IMPORT_CHECKPOINT_EVERY == 0:
+                await self.checkpoint()
+            await self.report_progress()
+            await asyncio.sleep(max(0.0, interval - (time.monotonic() - started)))
+
+        await self.report_progress(force=True)
+        await self.finish()
+
+    async def finish(self) -> None:
+        counts = self.state.counts
+        await VerificationUtils.log_to_channel(
+            self.bot,
+            VerificationUtils.create_log_embed(
+                "Bulk Verification Import",
+                f"Processed {self.state.position}/{self.total} users",
+                discord.Color.green() if self.state.position == self.total else discord.Color.red(),
+                [
+                    ("Admin", self.state.admin, True),
+                    ("Job", self.state.job_id, True),
+                    ("Assigned", str(counts['assigned']), True),
+                    ("Already Verified", str(counts['already_verified']), True),
+                    ("Not Found", str(counts['not_found']), True),
+                    ("Failed", str(counts['failed']), True)
+                ]
+            ),
+            self.resolver.guild_id
+        )
+        try:
+            await asyncio.to_thread(os.remove, self.path)
+        except FileNotFoundError:
+            pass
+
+class BulkImportManager:
+    """Runs bulk import jobs one at a time and resumes unfinished ones"""
+
+    def __init__(self, bot, guilds):
+        self.bot = bot
+        self.guilds = guilds
+        self.current: Optional[BulkImportJob] = None
+        self._task: Optional[asyncio.Task] = None
+        # Jobs started by this process, their checkpoints must not be resumed again
+        self._started: set[str] = set()
+        self._stopped = False
+
+    @property
+    def busy(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def submit(self, job: BulkImportJob) -> None:
+        self._started.add(job.state.job_id)
+        self.current = job
+        self._task = asyncio.create_task(self._run(job), name=f"bulk-import-{job.state.job_id}")
+
+    async def _run(self, job: BulkImportJob) -> None:
+        try:
+            await job.run()
+        except asyncio.CancelledError:
+            await job.checkpoint()
+            raise
+        except Exception as e:
+            logger.error(f"Bulk import {job.state.job_id} crashed: {e}", exc_info=e)
+            await job.checkpoint()
+
+    async def resume(self) -> None:
+        """Continue checkpointed jobs left over from a previous run.
+
+        An admin may start a job while this waits for the bot to be ready, so
+        jobs of this process are skipped and each resumed job waits its turn.
+        """
+        if not os.path.isdir(Config.BULK_IMPORT_DIR):
+            return
+        await self.bot.wait_until_ready()
+        for name in sorted(os.listdir(Config.BULK_IMPORT_DIR)):
+            if not name.endswith(".json") or name[:-len(".json")] in self._started:
+                continue
+            while self.busy:
+                await asyncio.gather(self._task, return_exceptions=True)
+            if self._stopped:
+                return
+            if not os.path.exists(os.path.join(Config.BULK_IMPORT_DIR, name)):
+                continue
+            try:
+                job = BulkImportJob.load(self.bot, self.guilds, os.path.join(Config.BULK_IMPORT_DIR, name))
+            except (OSError, ValueError, TypeError) as e:
+                logger.error(f"Skipping unreadable bulk import checkpoint {name}: {e}")
+                continue
+            if job.state.job_id in self._started:
+                continue
+            logger.info(f"Resuming bulk import {job.state.job_id} at {job.state.position}/{job.total}")
+            self.submit(job)
+
+    async def stop(self) -> None:
+        self._stopped = True
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
@@ -0,0 +1,115 @@
+import logging
+import time
+from collections import deque
+from .config import Config
+
+logger = logging.getLogger('email_verification')
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a dependency whose breaker is open"""
+    pass
+
+class CircuitBreaker:
+    """Stops calling a dependency that keeps failing or responding slowly.
+
+    While closed, the outcome of the last `window` calls is tracked, and a call
+    slower than `slow_call` seconds counts as failed. Once at least `min_calls`
+    are tracked and `failure_rate` of them failed, the breaker opens and
+    rejects calls for `open_seconds`. It then goes half-open and lets
+    `half_open_trials` calls through: if they all succeed it closes again, a
+    single failure opens it for another period.
+
+    Not thread-safe; call allow() and record() from the event loop.
+    """
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, name: str, slow_call: float, window: int = Config.BREAKER_WINDOW,
+                 min_calls: int = Config.BREAKER_MIN_CALLS, failure_rate: float = Config.BREAKER_FAILURE_RATE,
+                 open_seconds: float = Config.BREAKER_OPEN_SECONDS, half_open_trials: int = Config.BREAKER_HALF_OPEN_TRIALS):
+        self.name = name
+        self.slow_call = slow_call
+        self.min_calls = max(1, min_calls)
+        self.failure_rate = failure_rate
+        self.open_seconds = open_seconds
+        self.half_open_trials = max(1, half_open_trials)
+        self._outcomes: deque[bool] = deque(maxlen=max(self.min_calls, window))
+        self._state = self.CLOSED
+        self._opened_at = 0.0
+        self._trials = 0
+        self._trial_successes = 0
+        self.times_opened = 0
+        self.rejected = 0
+
+    @property
+    def state(self) -> str:
+        if self._state == self.OPEN and time.monotonic() >= self._opened_at + self.open_seconds:
+            self._state = self.HALF_OPEN
+            self._trials = 0
+            self._trial_successes = 0
+            logger.info(f"Circuit breaker {self.name} half-open, trying {self.half_open_trials} call(s)")
+        return self._state
+
+    @property
+    def rejecting(self) -> bool:
+        """Whether calls are currently refused outright"""
+        return self.state == self.OPEN
+
+    def retry_after(self) -> float:
+        """Seconds until the breaker lets trial calls through"""
+        if self.state != self.OPEN:
+            return 0.0
+        return max(0.0, self._opened_at + self.open_seconds - time.monotonic())
+
+    def allow(self) -> bool:
+        """Whether a call may go ahead; every allowed call must be followed by record()"""
+        state = self.state
+        if state == self.CLOSED:
+            return True
+        if state == self.HALF_OPEN and self._trials < self.half_open_trials:
+            self._trials += 1
+            return True
+        self.rejected += 1
+        return False
+
+    def record(self, success: bool, duration: float = 0.0) -> None:
+        failed = not success or duration > self.slow_call
+        if self._state == self.HALF_OPEN:
+            if failed:
+                self._open("a trial call failed")
+                return
+            self._trial_successes += 1
+            if self._trial_successes >= self.half_open_trials:
+                self._state = self.CLOSED
+                self._outcomes.clear()
+                logger.info(f"Circuit breaker {self.name} closed")
+            return
+        if self._state == self.OPEN:
+            # Result of a call that started before the breaker opened
+            return
+
+        self._outcomes.append(failed)
+        if len(self._outcomes) >= self.min_calls and self.current_failure_rate() >= self.failure_rate:
+            self._open(f"{self.current_failure_rate():.0%} of the last {len(self._outcomes)} calls failed or were slow")
+
+    def _open(self, reason: str) -> None:
+        self._state = self.OPEN
+        self._opened_at = time.monotonic()
+        self.times_opened += 1
+        logger.warning(f"Circuit breaker {self.name} opened for {self.open_seconds}s: {reason}")
+
+    def current_failure_rate(self) -> float:
+        if not self._outcomes:
+            return 0.0
+        return sum(self._outcomes) / len(self._outcomes)
+
+    def stats(self) -> dict:
+        return {
+            'state': self.state,
+            'failure_rate': self.current_failure_rate(),
+            'calls': len(self._outcomes),
+            'times_opened': self.times_opened,
+            'rejected': self.rejected,
+            'retry_after': self.retry_after(),
+        }
@@ -1,7 +1,12 @@
 from discord.ext import commands
+from discord import app_commands
 import discord
+import io
 from typing import Optional
 from .commands import VerificationCommands
+from .email_service import EmailService
+from .interaction import ConfirmModal, InteractionContext, VerifyModal
+from . import profiler
 from .config import Config
 
 class EmailVerification(commands.Cog, name="Email Verification"):
@@ -11,6 +16,45 @@ class EmailVerification(commands.Cog, name="Email Verification"):
         super().__init__()
         self.bot = bot
         self.cmd_handler = VerificationCommands(bot)
+        self._debug_sessions: set[str] = set()
+
+    async def cog_load(self):
+        await self.cmd_handler.start()
+
+    async def cog_unload(self):
+        await self.cmd_handler.stop()
+
+    @commands.Cog.listener()
+    async def on_guild_available(self, guild):
+        self.cmd_handler.guilds.on_guild_available(guild)
+
+    @commands.Cog.listener()
+    async def on_guild_unavailable(self, guild):
+        self.cmd_handler.guilds.on_guild_unavailable(guild)
+
+    @commands.Cog.listener()
+    async def on_guild_role_create(self, role):
+        self.cmd_handler.guilds.on_role_change(role)
+
+    @commands.Cog.listener()
+    async def on_guild_role_update(self, before, after):
+        self.cmd_handler.guilds.on_role_change(after)
+
+    @commands.Cog.listener()
+    async def on_guild_role_delete(self, role):
+        self.cmd_handler.guilds.on_role_delete(role)
+
+    @commands.Cog.listener()
+    async def on_guild_channel_create(self, channel):
+        self.cmd_handler.guilds.on_channel_change(channel)
+
+    @commands.Cog.listener()
+    async def on_guild_channel_update(self, before, after):
+        self.cmd_handler.guilds.on_channel_change(after)
+
+    @commands.Cog.listener()
+    async def on_guild_channel_delete(self, channel):
+        self.cmd_handler.guilds.on_channel_delete(channel)
 
     @commands.command(name="verify", brief="Verifiziere dich mit deiner @thu.de Email-Adresse")
     @commands.dm_only()
@@ -24,6 +68,24 @@ class EmailVerification(commands.Cog, name="Email Verification"):
         """Confirm your email with the verification code"""
         await self.cmd_handler.confirm_email(ctx, code)
 
+    @app_commands.command(name="verify", description="Verifiziere dich mit deiner @thu.de Email-Adresse")
+    @app_commands.describe(email="Deine @thu.de E-Mail-Adresse")
+    async def verify_slash(self, interaction: discord.Interaction, email: Optional[str] = None):
+        """Start email verification, asks for the address in a modal if none is given"""
+        if email is None:
+            return await interaction.response.send_modal(VerifyModal(self.cmd_handler))
+        ctx = await InteractionContext.defer(interaction)
+        await self.cmd_handler.verify_email(ctx, email)
+
+    @app_commands.command(name="confirm", description="Bestätige Verifizierung mit Code aus Email")
+    @app_commands.describe(code="Der Verifizierungscode aus der E-Mail")
+    async def confirm_slash(self, interaction: discord.Interaction, code: Optional[str] = None):
+        """Confirm your email, asks for the code in a modal if none is given"""
+        if code is None:
+            return await interaction.response.send_modal(ConfirmModal(self.cmd_handler))
+        ctx = await InteractionContext.defer(interaction)
+        await self.cmd_handler.confirm_email(ctx, code)
+
     @commands.command(name="remove_verify")
     @commands.has_permissions(administrator=True)
     async def remove_verify(self, ctx, member: discord.Member):
@@ -40,7 +102,41 @@ class EmailVerification(commands.Cog, name="Email Verification"):
         elif isinstance(error, commands.MissingPermissions):
             await ctx.send("Du benötigst Administrator-Rechte um diesen Befehl auszuführen!")
 
-    @commands.command(name="verify_debug")
+    @commands.command(name="check_roster")
+    @commands.has_permissions(administrator=True)
+    async def check_roster(self, ctx, column: Optional[str] = None):
+        """Classify an attached roster of email addresses, optionally from a column number or name (Admin only)"""
+        await self.cmd_handler.check_roster(ctx, column)
+
+    @commands.command(name="verify_import")
+    @commands.has_permissions(administrator=True)
+    @commands.guild_only()
+    async def import_verified(self, ctx):
+        """Assign the Verified role to all user IDs in an attached file (Admin only)"""
+        await self.cmd_handler.import_verified(ctx)
+
+    @commands.command(name="verify_outbox")
+    @commands.has_permissions(administrator=True)
+    @commands.guild_only()
+    async def outbox_status(self, ctx):
+        """Show undelivered and failed verification emails (Admin only)"""
+        await self.cmd_handler.outbox_status(ctx)
+
+    @commands.group(name="verify_audit", invoke_without_command=True)
+    @commands.has_permissions(administrator=True)
+    @commands.guild_only()
+    async def audit(self, ctx, hours: int = 24):
+        """Count verification events of the last hours (Admin only)"""
+        await self.cmd_handler.audit_stats(ctx, hours)
+
+    @audit.command(name="user")
+    @commands.has_permissions(administrator=True)
+    @commands.guild_only()
+    async def audit_user(self, ctx, user: discord.Object):
+        """Show the latest verification events of a user (Admin only)"""
+        await self.cmd_handler.audit_user(ctx, user.id)
+
+    @commands.group(name="verify_debug", invoke_without_command=True)
     @commands.has_permissions(administrator=True)
     async def debug_verify(self, ctx):
         """Debug command to show verification system status"""
@@ -65,5 +161,98 @@ class EmailVerification(commands.Cog, name="Email Verification"):
                   f"Bot Command Count: {len(self.bot.commands)}",
             inline=False
         )
+
+        limits = self.cmd_handler.rate_limits.stats()
+        rejected = ", ".join(f"{name}: {count}" for name, count in limits['rejected'].items()) or "none"
+        embed.add_field(
+            name="Rate Limits",
+            value=f"Allowed: {limits['allowed']}\n"
+                  f"Rejected: {rejected}\n"
+                  f"Tracked users/emails: {limits['tracked_users']}/{limits['tracked_emails']}",
+            inline=False
+        )
+
+        pending = self.cmd_handler.pending_verifications.stats()
+        capacity = f"/{pending['capacity']}" if pending['capacity'] else ""
+        held = (f"Memory: {pending['memory_bytes'] / 1024:.1f} KiB" if 'memory_bytes' in pending
+                else f"Shared: {pending['path']}")
+        embed.add_field(
+            name="Pending Verifications",
+            value=f"Entries: {pending['entries']}{capacity}\n"
+                  f"Evictions: {pending['evictions']}, expirations: {pending['expirations']}\n"
+                  f"{held}",
+            inline=False
+        )
+
+        pool = EmailService.pool_stats()
+        embed.add_field(
+            name="SMTP Pool",
+            value=f"Open sessions: {pool['open']}/{pool['size']}, idle: {pool['idle']}",
+            inline=False
+        )
+
+        breakers = []
+        guild_resolvers = list(self.cmd_handler.guilds) or [self.cmd_handler.guilds.default]
+        for breaker in [EmailService.breaker] + [resolver.log_breaker for resolver in guild_resolvers]:
+            stats = breaker.stats()
+            line = (f"{breaker.name}: {stats['state']}, {stats['failure_rate']:.0%} of {stats['calls']} calls failed, "
+                    f"opened {stats['times_opened']}x, rejected {stats['rejected']}")
+            if stats['retry_after']:
+                line += f", half-open in {stats['retry_after']:.0f}s"
+            breakers.append(line)
+        embed.add_field(name="Circuit Breakers", value="\n".join(breakers), inline=False)
+
+        guilds = []
+        for resolver in self.cmd_handler.guilds:
+            role = resolver.verified_role()
+            guilds.append(f"{resolver.guild_id}: {resolver.validator.domain}, "
+                          f"role {role.name if role else 'missing'}, log #{resolver.log_channel_name}, "
+                          f"members {resolver.member_cache_hits} cached/{resolver.member_fetches} fetched")
+        embed.add_field(name="Guilds", value="\n".join(guilds)[:1024] or "none configured", inline=False)
         
         await ctx.send(embed=embed)
+
+    async def run_debug_session(self, ctx, kind: str, seconds: int, measure):
+        """Run one profiling window at a time per kind and post its report"""
+        if kind in self._debug_sessions:
+            return await ctx.send(f"Es läuft bereits eine {kind}-Messung.")
+        if not 1 <= seconds <= profiler.MAX_WINDOW:
+            return await ctx.send(f"Das Zeitfenster muss zwischen 1 und {profiler.MAX_WINDOW} Sekunden liegen.")
+        self._debug_sessions.add(kind)
+        try:
+            await ctx.send(f"{kind} läuft für {seconds} Sekunden...")
+            lines = await measure(seconds)
+        except RuntimeError as e:
+            return await ctx.send(f"{kind} konnte nicht gestartet werden: {e}")
+        finally:
+            self._debug_sessions.discard(kind)
+
+        report = "\n".join(lines)
+        summary = "\n".join(lines[:25])
+        embed = discord.Embed(
+            title=f"Verification Debug: {kind}",
+            description=f"```\n{summary[:4000]}\n```",
+            color=discord.Color.blue()
+        )
+        await ctx.send(
+            embed=embed,
+            file=discord.File(io.BytesIO(report.encode('utf-8')), filename=f"{kind}.txt")
+        )
+
+    @debug_verify.command(name="profile")
+    @commands.has_permissions(administrator=True)
+    async def debug_profile(self, ctx, seconds: int = 30):
+        """Sample where the event loop spends its time (Admin only)"""
+        await self.run_debug_session(ctx, "profile", seconds, lambda s: profiler.profile(s, limit=50))
+
+    @debug_verify.command(name="looplag")
+    @commands.has_permissions(administrator=True)
+    async def debug_looplag(self, ctx, seconds: int = 30):
+        """Measure event loop lag and list slow callbacks (Admin only)"""
+        await self.run_debug_session(ctx, "looplag", seconds, profiler.measure_loop_lag)
+
+    @debug_verify.command(name="tracemalloc")
+    @commands.has_permissions(administrator=True)
+    async def debug_tracemalloc(self, ctx, seconds: int = 30):
+        """Show the biggest allocation sites over a time window (Admin only)"""
+        await self.run_debug_session(ctx, "tracemalloc", seconds, lambda s: profiler.track_allocations(s, limit=50))
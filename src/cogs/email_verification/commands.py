@@ -3,14 +3,34 @@ import discord
 from discord.ext import commands
 import secrets
 import asyncio
+import time
+import csv
+import io
 import logging
-from datetime import datetime
 from .config import Config
+from .mail_queue import EmailQueue
 from .email_service import EmailService
+from .log_sink import LogSink
+from .expiry import ExpiryScheduler
+from .pending_store import EmailPendingError, PendingVerificationStore
+from .audit import AuditLog
+from .shared_state import SharedPendingStore, SharedState, SharedVerifyRateLimits, StateBusyError
+from .verification_storage import VerificationStorage
+from .resolver import GuildDirectory, GuildResolver
+from .rate_limit import VerifyRateLimits
+from .bulk_import import BulkImportJob, BulkImportManager, parse_user_ids
+from .interaction import InteractionContext
 from .utils import VerificationUtils
+from .validation import EmailValidator
+from . import metrics
+from .metrics import CONFIRM_REQUESTS, CONFIRM_STAGE_SECONDS, VERIFY_REQUESTS, VERIFY_STAGE_SECONDS, StageTimer
 
 logger = logging.getLogger('email_verification')
 
+STATE_BUSY_MESSAGE = "Der Bot ist gerade ausgelastet. Bitte versuche es in ein paar Sekunden erneut."
+# Seconds until an expiry that found the shared state busy is tried again
+STATE_BUSY_RETRY = 5
+
 class VerificationError(Exception):
     """Base class for verification errors"""
     pass
@@ -27,7 +47,122 @@ class VerificationTimeoutError(VerificationError):
 class VerificationCommands:
     def __init__(self, bot):
         self.bot = bot
-        self.pending_verifications = {}
+        self.shared_state = SharedState.from_config()
+        if self.shared_state is not None:
+            self.pending_verifications = SharedPendingStore(self.shared_state)
+            self.rate_limits = SharedVerifyRateLimits(self.shared_state)
+        else:
+            self.pending_verifications = PendingVerificationStore()
+            self.rate_limits = VerifyRateLimits()
+        self.guilds = GuildDirectory.from_config(bot)
+        self.email_queue = EmailQueue(is_wanted=self._still_pending, default_guild_id=self.guilds.default.guild_id)
+        self.log_sink = LogSink(bot)
+        self.expiry = ExpiryScheduler(self.expire_verifications)
+        self.storage = VerificationStorage.from_config()
+        self.bulk_imports = BulkImportManager(bot, self.guilds)
+        self.metrics_server = metrics.MetricsServer() if Config.METRICS_ENABLED else None
+        self.audit_log: Optional[AuditLog] = None
+        self._background_tasks = set()
+
+    async def start(self):
+        """Start background services"""
+        VerificationUtils.set_guild_directory(self.guilds)
+        if Config.AUDIT_ENABLED:
+            self.audit_log = AuditLog(default_guild_id=self.guilds.default.guild_id)
+            await self.audit_log.setup()
+            VerificationUtils.set_audit_log(self.audit_log)
+        self.log_sink.start()
+        VerificationUtils.set_log_sink(self.log_sink)
+        self.expiry.start()
+        if self.storage is not None:
+            await self.storage.setup()
+        await self.email_queue.start()
+        if Config.PROCESS_INDEX == 0:
+            # Checkpoints are shared, only one process may pick them up
+            self._spawn(self.bulk_imports.resume())
+
+        metrics.PENDING_VERIFICATIONS.set_function(lambda: len(self.pending_verifications))
+        metrics.EMAIL_QUEUE_DEPTH.set_function(self.email_queue.queue.qsize)
+        metrics.LOG_BUFFER_DEPTH.set_function(lambda: self.log_sink.depth)
+        metrics.EXPIRY_SCHEDULED.set_function(lambda: len(self.expiry))
+        if self.metrics_server is not None:
+            try:
+                await self.metrics_server.start()
+            except OSError as e:
+                logger.error(f"Failed to start metrics server: {e}")
+
+    async def stop(self):
+        """Stop background services"""
+        if self.metrics_server is not None:
+            await self.metrics_server.stop()
+        await self.bulk_imports.stop()
+        await self.email_queue.stop()
+        await self.expiry.stop()
+        if self.storage is not None:
+            await self.storage.close()
+        VerificationUtils.set_log_sink(None)
+        await self.log_sink.stop()
+        if self.audit_log is not None:
+            VerificationUtils.set_audit_log(None)
+            await self.audit_log.close()
+            self.audit_log = None
+        if self.shared_state is not None:
+            self.shared_state.close()
+        VerificationUtils.set_guild_directory(None)
+
+    def _still_pending(self, user_id: int, code: str) -> bool:
+        """Whether a queued email's code is still the one the user has to enter"""
+        verification = self.pending_verifications.get(user_id)
+        return (verification is not None and verification.code == code
+                and not self.pending_verifications.is_expired(verification))
+
+    def _discard_pending(self, user_id: int) -> None:
+        """Drop a pending verification together with its expiry"""
+        self.pending_verifications.delete(user_id)
+        self.expiry.cancel(user_id)
+
+    async def expire_verifications(self, expired: list):
+        """Drop expired verifications, audit each one and log them as one batch per guild"""
+        by_guild: dict[Optional[int], list] = {}
+        for user_id, (user, email, guild_id) in expired:
+            try:
+                verification = self.pending_verifications.expire(user_id)
+            except StateBusyError:
+                # Another process holds the shared state, try again shortly
+                self.expiry.schedule(user_id, STATE_BUSY_RETRY, (user, email, guild_id))
+                continue
+            if verification is not None:
+                by_guild.setdefault(guild_id, []).append((user, email))
+                if self.audit_log is not None:
+                    self.audit_log.record_event(
+                        user_id, "Verification Timeout", email, "Verification code expired",
+                        {"User": user, "Email": email}, VerificationUtils.resolver_for(self.bot, guild_id).guild_id
+                    )
+
+        for guild_id, fields in by_guild.items():
+            # An embed holds at most 25 fields
+            shown = fields[:24]
+            log_fields = [(user, email, True) for user, email in shown]
+            if len(fields) > len(shown):
+                log_fields.append(("…", f"and {len(fields) - len(shown)} more", False))
+            await VerificationUtils.log_to_channel(
+                self.bot,
+                VerificationUtils.create_log_embed(
+                    "Verification Timeout",
+                    f"{len(fields)} verification code(s) expired",
+                    discord.Color.yellow(),
+                    log_fields
+                ),
+                guild_id,
+                audit=False
+            )
+
+    def _spawn(self, coro):
+        """Run a coroutine in the background and keep a reference until it finishes"""
+        task = asyncio.create_task(coro)
+        self._background_tasks.add(task)
+        task.add_done_callback(self._background_tasks.discard)
+        return task
 
     async def handle_unexpected_error(self, ctx, error):
         """Handle unexpected errors and log them"""
@@ -43,15 +178,46 @@ class VerificationCommands:
                     ("Error Type", type(error).__name__, True),
                     ("Error", str(error), False)
                 ]
-            )
+            ),
+            ctx.guild.id if ctx.guild else None
         )
         await ctx.send(f"Ein unerwarteter Fehler ist aufgetreten. Error ID: {error_id}")
         logger.error(f"Unexpected error {error_id}: {str(error)}", exc_info=error)
 
+    async def select_guild(self, ctx, email: str) -> Optional[GuildResolver]:
+        """Pick the guild a verification is for, None if the user is already verified.
+
+        A command used in a configured guild verifies for that guild. Otherwise
+        it is the first configured guild the user is a member of, is not yet
+        verified in and whose rules accept the address. Users who are in no
+        configured guild get the default one, as with a single guild.
+        """
+        resolver = self.guilds.get(ctx.guild.id) if ctx.guild else None
+        candidates = [resolver] if resolver is not None else list(self.guilds) or [self.guilds.default]
+        unverified = None
+        verified = False
+        for candidate in candidates:
+            member = await candidate.get_member(ctx.author.id)
+            if member is None:
+                continue
+            if candidate.is_member_verified(member):
+                verified = True
+                continue
+            if VerificationUtils.is_valid_student_email(email, candidate.validator)[0]:
+                return candidate
+            if unverified is None:
+                unverified = candidate
+        if verified:
+            return None
+        # Validation against its rules tells the user what is wrong with the address
+        return unverified or candidates[0]
+
     async def verify_email(self, ctx, email: Optional[str] = None):
         """Handle the verify command"""
+        stages = StageTimer(VERIFY_STAGE_SECONDS)
         try:
             if not email:
+                VERIFY_REQUESTS.labels('no_email').inc()
                 await VerificationUtils.log_to_channel(
                     self.bot,
                     VerificationUtils.create_log_embed(
@@ -63,30 +229,60 @@ class VerificationCommands:
                 )
                 return await ctx.send(f"Bitte gebe deine @thu.de E-Mail-Adresse an.\n")
 
-            # Check if user already has Verified role
-            guild = ctx.bot.get_guild(Config.GUILD_ID)
-            if guild:
-                member = await guild.fetch_member(ctx.author.id)
-                if member:
-                    verified_role = discord.utils.get(guild.roles, name="Verified")
-                    if verified_role and verified_role in member.roles:
-                        await VerificationUtils.log_to_channel(
-                            self.bot,
-                            VerificationUtils.create_log_embed(
-                                "Verification Attempt - Already Verified",
-                                "User already has Verified role",
-                                discord.Color.yellow(),
-                                [
-                                    ("User", f"{ctx.author} ({ctx.author.id})", True),
-                                    ("Email", email, True)
-                                ]
-                            )
-                        )
-                        return await ctx.send("Du bist bereits verifiziert!")
+            # Asking again soon after gets the code already on its way instead of another email
+            pending = self.pending_verifications.get(ctx.author.id)
+            if (pending is not None and pending.email.lower() == email.lower()
+                    and pending.age() < Config.VERIFY_RESEND_COOLDOWN
+                    and not self.pending_verifications.is_expired(pending)):
+                VERIFY_REQUESTS.labels('code_reused').inc()
+                wait = max(1, round(Config.VERIFY_RESEND_COOLDOWN - pending.age()))
+                return await ctx.send(f"Dein Verifizierungscode wurde bereits an {pending.email} gesendet. "
+                                      "Bitte überprüfe dein Postfach, auch den Spam-Ordner.\n"
+                                      f"Benutze `{ctx.prefix}confirm <code>` um die Verifizierung abzuschließen. "
+                                      f"Einen neuen Code kannst du in {wait} Sekunde(n) anfordern.")
+
+            # Fail fast instead of queueing mails the SMTP server will not take
+            if EmailService.breaker.rejecting:
+                VERIFY_REQUESTS.labels('smtp_unavailable').inc()
+                minutes = max(1, round(EmailService.breaker.retry_after() / 60))
+                return await ctx.send("Der E-Mail-Versand ist gerade gestört. "
+                                      f"Bitte versuche es in etwa {minutes} Minute(n) erneut.")
+
+            # Checked before anything that costs a REST call; the mail's tokens are taken once it is queued
+            limit, retry_after = self.rate_limits.check(ctx.author.id, email)
+            stages.mark('rate_limit')
+            if limit is not None:
+                VERIFY_REQUESTS.labels('rate_limited').inc()
+                logger.info(f"Rate limited verify from {ctx.author.id} ({limit} limit)")
+                minutes = max(1, round(retry_after / 60))
+                return await ctx.send(f"Zu viele Verifizierungsanfragen. Bitte versuche es in etwa {minutes} Minute(n) erneut.")
+
+            # Also checks whether the user already has the Verified role
+            resolver = await self.select_guild(ctx, email)
+            stages.mark('member_lookup')
+            if resolver is None:
+                VERIFY_REQUESTS.labels('already_verified').inc()
+                await VerificationUtils.log_to_channel(
+                    self.bot,
+                    VerificationUtils.create_log_embed(
+                        "Verification Attempt - Already Verified",
+                        "User already has Verified role",
+                        discord.Color.yellow(),
+                        [
+                            ("User", f"{ctx.author} ({ctx.author.id})", True),
+                            ("Email", email, True)
+                        ]
+                    ),
+                    ctx.guild.id if ctx.guild else None
+                )
+                return await ctx.send("Du bist bereits verifiziert!")
+            guild_id = resolver.guild_id
 
             try:
-                is_valid, message = VerificationUtils.is_valid_student_email(email)
+                is_valid, message = VerificationUtils.is_valid_student_email(email, resolver.validator)
+                stages.mark('validate')
                 if not is_valid:
+                    VERIFY_REQUESTS.labels('invalid_email').inc()
                     await VerificationUtils.log_to_channel(
                         self.bot,
                         VerificationUtils.create_log_embed(
@@ -98,92 +294,154 @@ class VerificationCommands:
                                 ("Email", email, True),
                                 ("Reason", message, False)
                             ]
-                        )
+                        ),
+                        guild_id
                     )
                     return await ctx.send("Ungültige E-Mail-Adresse. Bitte verwende deine THU-E-Mail-Adresse.")
             except Exception as e:
                 logger.error(f"Failed to validate email: {e}")
                 return await ctx.send("Es gab einen Fehler bei der E-Mail-Validierung.")
 
-            await ctx.send("Sende Verifizierungscode... Dies kann einen Moment dauern.")
+            if self.storage is not None:
+                in_use, owner_id = await self.storage.is_email_used(email)
+                stages.mark('storage_check')
+                if in_use and owner_id != str(ctx.author.id):
+                    VERIFY_REQUESTS.labels('email_in_use').inc()
+                    await VerificationUtils.log_to_channel(
+                        self.bot,
+                        VerificationUtils.create_log_embed(
+                            "Verification Attempt - Email In Use",
+                            "Email is already linked to another account",
+                            discord.Color.red(),
+                            [
+                                ("User", f"{ctx.author} ({ctx.author.id})", True),
+                                ("Email", email, True),
+                                ("Linked User", owner_id, True)
+                            ]
+                        ),
+                        guild_id
+                    )
+                    return await ctx.send("Diese E-Mail-Adresse wird bereits von einem anderen Account verwendet.")
+
             verification_code = secrets.token_hex(3).upper()
-            
+
+            # Replaces an older code of the user, but never another user's code for the address
             try:
-                # Store pending verification in memory only
-                self.pending_verifications[ctx.author.id] = {
-                    'email': email,
-                    'code': verification_code,
-                    'attempts': 0,
-                    'timestamp': datetime.utcnow()
-                }
-                
-                EmailService.send_verification_email(email, verification_code, str(ctx.author))
-                
-                async def timeout_verification():
-                    try:
-                        await asyncio.sleep(Config.VERIFICATION_TIMEOUT)
-                        if ctx.author.id in self.pending_verifications:
-                            del self.pending_verifications[ctx.author.id]
-                            await VerificationUtils.log_to_channel(
-                                self.bot,
-                                VerificationUtils.create_log_embed(
-                                    "Verification Timeout",
-                                    "Verification code expired",
-                                    discord.Color.yellow(),
-                                    [
-                                        ("User", f"{ctx.author} ({ctx.author.id})", True),
-                                        ("Email", email, True)
-                                    ]
-                                )
-                            )
-                    except Exception as e:
-                        logger.error(f"Error in timeout task: {e}")
-                
-                asyncio.create_task(timeout_verification())
-                
+                self.pending_verifications.put(ctx.author.id, email, verification_code, guild_id)
+            except EmailPendingError as e:
+                VERIFY_REQUESTS.labels('email_pending').inc()
                 await VerificationUtils.log_to_channel(
                     self.bot,
                     VerificationUtils.create_log_embed(
-                        "Verification Code Sent",
-                        "Verification email sent successfully",
-                        discord.Color.blue(),
+                        "Verification Attempt - Email Pending",
+                        "Email has a pending verification on another account",
+                        discord.Color.red(),
                         [
                             ("User", f"{ctx.author} ({ctx.author.id})", True),
-                            ("Email", email, True)
+                            ("Email", email, True),
+                            ("Pending User", str(e.owner_id), True)
                         ]
-                    )
+                    ),
+                    guild_id
                 )
-                
-                await ctx.send("✅ Verifizierungscode wurde gesendet!\n"
-                             "Bitte überprüfe deine Universitäts-E-Mail für den Verifizierungscode.\n"
-                             f"Benutze `{Config.PREFIX}confirm <code>` um die Verifizierung abzuschließen.\n"
-                             "Der Code läuft in 5 Minuten ab.")
-                
-            except Exception as e:
-                logger.error(f"Failed to send verification email: {e}")
-                if ctx.author.id in self.pending_verifications:
-                    try:
-                        del self.pending_verifications[ctx.author.id]
-                    except Exception as cleanup_error:
-                        logger.error(f"Failed to clean up pending verification: {cleanup_error}")
-                await ctx.send("Es gab einen Fehler beim Senden der Verifizierungs-E-Mail.")
-                return
+                return await ctx.send("Für diese E-Mail-Adresse läuft bereits eine Verifizierung über einen anderen Account. "
+                                      "Bitte versuche es in ein paar Minuten erneut.")
+
+            limit, retry_after = self.rate_limits.take_send(email)
+            if limit is not None:
+                VERIFY_REQUESTS.labels('rate_limited').inc()
+                logger.info(f"Rate limited verify from {ctx.author.id} ({limit} limit)")
+                self._discard_pending(ctx.author.id)
+                minutes = max(1, round(retry_after / 60))
+                return await ctx.send(f"Zu viele Verifizierungsanfragen. Bitte versuche es in etwa {minutes} Minute(n) erneut.")
+
+            try:
+                delivery = await self.email_queue.submit(email, verification_code, str(ctx.author), ctx.author.id,
+                                                         guild_id)
+            except asyncio.QueueFull:
+                VERIFY_REQUESTS.labels('queue_full').inc()
+                logger.warning(f"Email queue full, rejecting verification for {ctx.author.id}")
+                self._discard_pending(ctx.author.id)
+                return await ctx.send("Der E-Mail-Versand ist gerade ausgelastet. Bitte versuche es in ein paar Minuten erneut.")
+            except Exception:
+                # No mail goes out, so the code must not block a new request for the address
+                self._discard_pending(ctx.author.id)
+                raise
+
+            # A deferred interaction already shows the user that we are working on it
+            if not isinstance(ctx, InteractionContext):
+                await ctx.send("Sende Verifizierungscode... Dies kann einen Moment dauern.")
+
+            self.expiry.schedule(ctx.author.id, Config.VERIFICATION_TIMEOUT,
+                                 (f"{ctx.author} ({ctx.author.id})", email, guild_id))
+            self._spawn(self.report_delivery(ctx, email, verification_code, delivery, guild_id))
+            stages.mark('enqueue')
+            VERIFY_REQUESTS.labels('queued').inc()
 
+        except StateBusyError as e:
+            VERIFY_REQUESTS.labels('state_busy').inc()
+            logger.warning(f"Shared state busy, rejecting verification for {ctx.author.id}: {e}")
+            await ctx.send(STATE_BUSY_MESSAGE)
         except Exception as e:
+            VERIFY_REQUESTS.labels('error').inc()
             logger.error(f"Unexpected error in verify_email: {e}")
             await self.handle_unexpected_error(ctx, e)
 
 
 
+    async def report_delivery(self, ctx, email: str, code: str, delivery: asyncio.Future,
+                              guild_id: Optional[int] = None):
+        """Wait for a queued verification email and tell the user how it went"""
+        try:
+            await delivery
+        except asyncio.CancelledError:
+            logger.warning(f"Verification email to {email} was cancelled")
+            return
+        except Exception as e:
+            logger.error(f"Failed to send verification email: {e}")
+            # Only drop the entry this email belonged to, not a newer request
+            verification = self.pending_verifications.get(ctx.author.id)
+            if verification and verification.code == code:
+                self._discard_pending(ctx.author.id)
+            try:
+                await ctx.send("Es gab einen Fehler beim Senden der Verifizierungs-E-Mail.")
+            except Exception as send_error:
+                logger.error(f"Failed to report delivery failure: {send_error}")
+            return
+
+        try:
+            await VerificationUtils.log_to_channel(
+                self.bot,
+                VerificationUtils.create_log_embed(
+                    "Verification Code Sent",
+                    "Verification email sent successfully",
+                    discord.Color.blue(),
+                    [
+                        ("User", f"{ctx.author} ({ctx.author.id})", True),
+                        ("Email", email, True)
+                    ]
+                ),
+                guild_id
+            )
+
+            await ctx.send("✅ Verifizierungscode wurde gesendet!\n"
+                         "Bitte überprüfe deine Universitäts-E-Mail für den Verifizierungscode.\n"
+                         f"Benutze `{ctx.prefix}confirm <code>` um die Verifizierung abzuschließen.\n"
+                         "Der Code läuft in 5 Minuten ab.")
+        except Exception as e:
+            logger.error(f"Failed to report delivery: {e}")
+
     async def confirm_email(self, ctx, code: Optional[str] = None):
         """Handle the confirm command"""
         try:
             if code is None: # user gave no code 
+                CONFIRM_REQUESTS.labels('no_code').inc()
                 return await ctx.send(f"Bitte gib den Verifizierungscode an.\n"
-                    f"Beispiel: `{Config.PREFIX}confirm 12345`")
+                    f"Beispiel: `{ctx.prefix}confirm 12345`")
             else:
                 verification = self.pending_verifications.get(ctx.author.id)
                 if not verification:
+                    CONFIRM_REQUESTS.labels('no_pending').inc()
                     await VerificationUtils.log_to_channel(
                         self.bot,
                         VerificationUtils.create_log_embed(
@@ -193,15 +451,16 @@ class VerificationCommands:
                             [("User", f"{ctx.author} ({ctx.author.id})", True)]
                         )
                     )
-                    return await ctx.send(f"Keine ausstehende Verifizierung. Bitte benutze `{Config.PREFIX}verify <email>` zuerst.")
+                    return await ctx.send(f"Keine ausstehende Verifizierung. Bitte benutze `{ctx.prefix}verify <email>` zuerst.")
 
                 # Check if verification has timed out
-                time_elapsed = (datetime.utcnow() - verification['timestamp']).total_seconds()
-                if time_elapsed > Config.VERIFICATION_TIMEOUT:
-                    del self.pending_verifications[ctx.author.id]
-                    return await ctx.send(f"Dein Verifizierungscode ist abgelaufen. Bitte benutze `{Config.PREFIX}verify <email>` um einen neuen Code anzufordern.")
+                if self.pending_verifications.is_expired(verification):
+                    CONFIRM_REQUESTS.labels('expired').inc()
+                    self._discard_pending(ctx.author.id)
+                    return await ctx.send(f"Dein Verifizierungscode ist abgelaufen. Bitte benutze `{ctx.prefix}verify <email>` um einen neuen Code anzufordern.")
 
-                if verification['attempts'] >= 3:
+                if verification.attempts >= 3:
+                    CONFIRM_REQUESTS.labels('max_attempts').inc()
                     await VerificationUtils.log_to_channel(
                         self.bot,
                         VerificationUtils.create_log_embed(
@@ -210,64 +469,76 @@ class VerificationCommands:
                             discord.Color.red(),
                             [
                                 ("User", f"{ctx.author} ({ctx.author.id})", True),
-                                ("Email", verification['email'], True)
+                                ("Email", verification.email, True)
                             ]
-                        )
+                        ),
+                        verification.guild_id
                     )
-                    del self.pending_verifications[ctx.author.id]
-                    return await ctx.send(f"Zu viele Versuche. Bitte starte erneut mit `{Config.PREFIX}verify <email>`")
+                    self._discard_pending(ctx.author.id)
+                    return await ctx.send(f"Zu viele Versuche. Bitte starte erneut mit `{ctx.prefix}verify <email>`")
 
-                if code.upper() != verification['code']:
-                    verification['attempts'] += 1
+                if code.upper() != verification.code:
+                    verification.attempts = self.pending_verifications.add_attempt(ctx.author.id)
+                    CONFIRM_REQUESTS.labels('invalid_code').inc()
                     await VerificationUtils.log_to_channel(
                         self.bot,
                         VerificationUtils.create_log_embed(
                             "Invalid Verification Code",
-                            f"Attempt {verification['attempts']}/3",
+                            f"Attempt {verification.attempts}/3",
                             discord.Color.orange(),
                             [
                                 ("User", f"{ctx.author} ({ctx.author.id})", True),
-                                ("Email", verification['email'], True),
+                                ("Email", verification.email, True),
                                 ("Provided Code", code.upper(), True),
-                                ("Expected Code", verification['code'], True)
+                                ("Expected Code", verification.code, True)
                             ]
-                        )
+                        ),
+                        verification.guild_id
                     )
-                    return await ctx.send(f"Ungültiger Code. Noch {3 - verification['attempts']} Versuche übrig.")
+                    return await ctx.send(f"Ungültiger Code. Noch {3 - verification.attempts} Versuche übrig.")
 
 
 
             # Verification successful - just assign role
+            stages = StageTimer(CONFIRM_STAGE_SECONDS)
+            resolver = self.guilds.resolve(verification.guild_id)
             try:
-                guild = ctx.bot.get_guild(Config.GUILD_ID)
-                if guild:
-                    member = await guild.fetch_member(ctx.author.id)
-                    if member:
-                        verified_role = discord.utils.get(guild.roles, name="Verified")
-                        if verified_role:
-                            await member.add_roles(verified_role)
-                            await VerificationUtils.log_to_channel(
-                                self.bot,
-                                VerificationUtils.create_log_embed(
-                                    "Verification Successful",
-                                    "User verified and role assigned",
-                                    discord.Color.green(),
-                                    [
-                                        ("User", f"{ctx.author} ({ctx.author.id})", True),
-                                        ("Email", verification['email'], True)
-                                    ]
-                                )
-                            )
-                        else:
-                            await VerificationUtils.log_to_channel(
-                                self.bot,
-                                VerificationUtils.create_log_embed(
-                                    "Role Assignment Failed",
-                                    "Verified role not found",
-                                    discord.Color.red(),
-                                    [("User", f"{ctx.author} ({ctx.author.id})", True)]
-                                )
+                member = await resolver.get_member(ctx.author.id)
+                stages.mark('member_lookup')
+                if member:
+                    verified_role = resolver.verified_role()
+                    if verified_role:
+                        await member.add_roles(verified_role)
+                        stages.mark('role_assign')
+                        resolver.forget_member(member.id)
+                        if self.storage is not None:
+                            await self.storage.save_verified_user(
+                                ctx.author.id, VerificationStorage.hash_email(verification.email)
                             )
+                        await VerificationUtils.log_to_channel(
+                            self.bot,
+                            VerificationUtils.create_log_embed(
+                                "Verification Successful",
+                                "User verified and role assigned",
+                                discord.Color.green(),
+                                [
+                                    ("User", f"{ctx.author} ({ctx.author.id})", True),
+                                    ("Email", verification.email, True)
+                                ]
+                            ),
+                            resolver.guild_id
+                        )
+                    else:
+                        await VerificationUtils.log_to_channel(
+                            self.bot,
+                            VerificationUtils.create_log_embed(
+                                "Role Assignment Failed",
+                                "Verified role not found",
+                                discord.Color.red(),
+                                [("User", f"{ctx.author} ({ctx.author.id})", True)]
+                            ),
+                            resolver.guild_id
+                        )
             except Exception as e:
                 await VerificationUtils.log_to_channel(
                     self.bot,
@@ -279,21 +550,40 @@ class VerificationCommands:
                             ("User", f"{ctx.author} ({ctx.author.id})", True),
                             ("Error", str(e), False)
                         ]
-                    )
+                    ),
+                    resolver.guild_id
                 )
 
-            del self.pending_verifications[ctx.author.id]
+            self._discard_pending(ctx.author.id)
+            CONFIRM_REQUESTS.labels('success').inc()
             await ctx.send("E-Mail erfolgreich verifiziert! Dir wurde die Verified-Rolle zugewiesen.")
 
+        except StateBusyError as e:
+            CONFIRM_REQUESTS.labels('state_busy').inc()
+            logger.warning(f"Shared state busy, rejecting confirmation for {ctx.author.id}: {e}")
+            await ctx.send(STATE_BUSY_MESSAGE)
         except Exception as e:
             await self.handle_unexpected_error(ctx, e)
 
+    async def _require_guild(self, ctx) -> Optional[GuildResolver]:
+        """Resolver of the guild an admin command is used in, tells the admin if it is not configured"""
+        resolver = self.guilds.get(ctx.guild.id) if ctx.guild else None
+        if resolver is None:
+            await ctx.send("Auf diesem Server ist keine Verifizierung eingerichtet.")
+        return resolver
+
     async def remove_verify(self, ctx, member: discord.Member):
         """Handle the remove_verify command"""
         try:
-            verified_role = discord.utils.get(ctx.guild.roles, name="Verified")
+            resolver = await self._require_guild(ctx)
+            if resolver is None:
+                return
+            verified_role = resolver.verified_role()
             if verified_role and verified_role in member.roles:
                 await member.remove_roles(verified_role)
+                resolver.forget_member(member.id)
+                if self.storage is not None:
+                    await self.storage.remove_verified_user(member.id)
                 
                 await VerificationUtils.log_to_channel(
                     self.bot,
@@ -305,10 +595,156 @@ class VerificationCommands:
                             ("User", f"{member} ({member.id})", True),
                             ("Admin", f"{ctx.author} ({ctx.author.id})", True)
                         ]
-                    )
+                    ),
+                    resolver.guild_id
                 )
                 await ctx.send(f"Verifizierung von {member} wurde entfernt.")
             else:
                 await ctx.send(f"{member} ist nicht verifiziert.")
         except Exception as e:
             await self.handle_unexpected_error(ctx, e)
+
+    async def check_roster(self, ctx, column: Optional[str] = None):
+        """Handle the check_roster command, the column is a 1-based number or a header name"""
+        try:
+            if not ctx.message.attachments:
+                return await ctx.send(f"Bitte hänge eine CSV- oder Textdatei mit E-Mail-Adressen an.\n"
+                                      f"Beispiel: `{Config.PREFIX}check_roster` mit angehängter `roster.csv`")
+
+            attachment = ctx.message.attachments[0]
+            content = (await attachment.read()).decode('utf-8-sig', errors='replace')
+            validator = self.guilds.resolve(ctx.guild.id if ctx.guild else None).validator
+            if column is not None and column.isdigit():
+                if int(column) < 1:
+                    return await ctx.send("Spaltennummern beginnen bei 1.")
+                column = int(column) - 1
+
+            def classify():
+                results = list(validator.classify_file(io.StringIO(content), column))
+                report = io.StringIO()
+                writer = csv.writer(report)
+                writer.writerow(("email", "class"))
+                writer.writerows((email, email_class.value) for email, email_class in results)
+                return EmailValidator.count(results), report.getvalue()
+
+            try:
+                counts, report = await asyncio.to_thread(classify)
+            except ValueError:
+                return await ctx.send(f"Die Spalte `{column}` wurde in der Datei nicht gefunden.")
+            embed = discord.Embed(
+                title="Roster Check",
+                description=f"{sum(counts.values())} addresses in {attachment.filename}",
+                color=discord.Color.blue()
+            )
+            for email_class, count in counts.most_common():
+                embed.add_field(name=email_class.value.capitalize(), value=str(count), inline=True)
+            await ctx.send(
+                embed=embed,
+                file=discord.File(io.BytesIO(report.encode('utf-8')), filename="roster_check.csv")
+            )
+        except Exception as e:
+            await self.handle_unexpected_error(ctx, e)
+
+    async def import_verified(self, ctx):
+        """Handle the verify_import command"""
+        try:
+            if not ctx.message.attachments:
+                return await ctx.send(f"Bitte hänge eine Datei mit Benutzer-IDs an.\n"
+                                      f"Beispiel: `{Config.PREFIX}verify_import` mit angehängter `ids.txt`")
+            if await self._require_guild(ctx) is None:
+                return
+            if self.bulk_imports.busy:
+                return await ctx.send(f"Es läuft bereits ein Import: {self.bulk_imports.current.progress_text()}")
+
+            content = (await ctx.message.attachments[0].read()).decode('utf-8', errors='replace')
+            user_ids = parse_user_ids(content)
+            if not user_ids:
+                return await ctx.send("Die Datei enthält keine gültigen Benutzer-IDs.")
+
+            job = BulkImportJob.create(self.bot, self.guilds, user_ids, f"{ctx.author} ({ctx.author.id})",
+                                       ctx.channel.id, ctx.guild.id)
+            self.bulk_imports.submit(job)
+            minutes = max(1, round(len(user_ids) / Config.BULK_IMPORT_RATE / 60))
+            await ctx.send(f"Import `{job.state.job_id}` für {len(user_ids)} Benutzer gestartet "
+                           f"(ca. {minutes} Minute(n)).")
+        except Exception as e:
+            await self.handle_unexpected_error(ctx, e)
+
+    async def outbox_status(self, ctx):
+        """Handle the verify_outbox command"""
+        try:
+            resolver = await self._require_guild(ctx)
+            if resolver is None:
+                return
+            stats = await self.email_queue.stats(resolver.guild_id)
+            embed = discord.Embed(
+                title="Email Outbox",
+                description=f"{stats['outbox']} undelivered email(s), {stats['dead']} dead letter(s)",
+                color=discord.Color.red() if stats['dead'] else discord.Color.blue()
+            )
+            embed.add_field(name="Queued", value=str(stats['queued']), inline=True)
+            embed.add_field(name="Waiting For Retry", value=str(stats['retrying']), inline=True)
+            embed.add_field(name="Dead Letters", value=str(stats['dead']), inline=True)
+            if self.email_queue.outbox is not None:
+                for email, attempts, error, updated_at in await self.email_queue.outbox.dead_letters(resolver.guild_id):
+                    embed.add_field(
+                        name=f"{email} ({attempts} attempts)",
+                        value=f"<t:{int(updated_at)}:R>: {(error or 'unknown error')[:200]}",
+                        inline=False
+                    )
+            await ctx.send(embed=embed)
+        except Exception as e:
+            await self.handle_unexpected_error(ctx, e)
+
+    async def audit_stats(self, ctx, hours: int):
+        """Handle the verify_audit command"""
+        try:
+            if self.audit_log is None:
+                return await ctx.send("Das Audit-Log ist deaktiviert.")
+            resolver = await self._require_guild(ctx)
+            if resolver is None:
+                return
+            started = time.perf_counter()
+            counts = await self.audit_log.event_counts(resolver.guild_id, time.time() - hours * 3600)
+            elapsed = (time.perf_counter() - started) * 1000
+            embed = discord.Embed(
+                title="Verification Audit",
+                description=f"{sum(count for _, count in counts)} events in the last {hours}h",
+                color=discord.Color.blue()
+            )
+            for event, count in counts[:25]:
+                embed.add_field(name=event or "Untitled", value=str(count), inline=True)
+            embed.set_footer(text=f"Query took {elapsed:.1f} ms")
+            await ctx.send(embed=embed)
+        except Exception as e:
+            await self.handle_unexpected_error(ctx, e)
+
+    async def audit_user(self, ctx, user_id: int):
+        """Handle the verify_audit user command"""
+        try:
+            if self.audit_log is None:
+                return await ctx.send("Das Audit-Log ist deaktiviert.")
+            resolver = await self._require_guild(ctx)
+            if resolver is None:
+                return
+            started = time.perf_counter()
+            timeline = await self.audit_log.user_timeline(resolver.guild_id, user_id)
+            elapsed = (time.perf_counter() - started) * 1000
+            if not timeline:
+                return await ctx.send(f"Keine Einträge für {user_id} gefunden.")
+            embed = discord.Embed(
+                title="Verification Audit",
+                description=f"Latest {len(timeline)} events of <@{user_id}> ({user_id})",
+                color=discord.Color.blue()
+            )
+            for created_at, event, email, description in timeline:
+                details = " – ".join(part for part in (email and email[:12], description) if part)
+                embed.add_field(
+                    name=event or "Untitled",
+                    value=f"<t:{int(created_at)}:f> {details}"[:1024],
+                    inline=False
+                )
+            embed.set_footer(text=f"Query took {elapsed:.1f} ms")
+            await ctx.send(embed=embed)
+        except Exception as e:
+            await self.handle_unexpected_error(ctx, e)
@@ -7,6 +7,7 @@ class Config:
     PREFIX = ">"
     SMTP_SERVER = os.getenv('SMTP_SERVER', 'smtp.gmail.com')
     SMTP_PORT = int(os.getenv('SMTP_PORT', '587'))
+    SMTP_STARTTLS = os.getenv('SMTP_STARTTLS', 'true').lower() == 'true'
     SENDER_EMAIL = os.getenv('SENDER_EMAIL')
     EMAIL_PASSWORD = os.getenv('EMAIL_PASSWORD')
     LOG_CHANNEL_NAME = os.getenv('LOG_CHANNEL_NAME', 'bot-logs')
@@ -15,4 +16,104 @@ class Config:
     PROF_PATTERN = r'^[a-zA-Z]+\.[a-zA-Z]+@thu\.de$'
     VERIFICATION_TIMEOUT = 300
     GUILD_ID = os.getenv('GUILD_ID')
- 
+    VERIFIED_ROLE_NAME = os.getenv('VERIFIED_ROLE_NAME', 'Verified')
+    # JSON list of per-guild settings; without it GUILD_ID and the values above are used
+    GUILD_CONFIG_PATH = os.getenv('GUILD_CONFIG_PATH', './data/guilds.json')
+
+    # Gateway: "minimal" only requests what verification needs, "all" everything
+    INTENTS_PROFILE = os.getenv('INTENTS_PROFILE', 'minimal')
+    MEMBERS_INTENT = os.getenv('MEMBERS_INTENT', 'false').lower() == 'true'
+    MEMBER_CACHE_SIZE = int(os.getenv('MEMBER_CACHE_SIZE', '1000'))
+    MEMBER_CACHE_TTL = 60
+    PENDING_CAPACITY = int(os.getenv('PENDING_CAPACITY', '10000'))
+
+    # Pending codes and rate limits: "memory" for one process, "sqlite" to share them
+    STATE_BACKEND = os.getenv('STATE_BACKEND', 'memory')
+    STATE_PATH = os.getenv('STATE_PATH', './data/state.db')
+    # Seconds a write waits for another process's lock; queries run on the event loop
+    STATE_BUSY_TIMEOUT = float(os.getenv('STATE_BUSY_TIMEOUT', '0.02'))
+
+    # Sharding: BOT_PROCESSES processes split SHARD_COUNT shards between them
+    BOT_PROCESSES = int(os.getenv('BOT_PROCESSES', '1'))
+    SHARD_COUNT = int(os.getenv('SHARD_COUNT', '0'))  # 0 means one shard per process
+    PROCESS_INDEX = int(os.getenv('PROCESS_INDEX', '0'))  # set by the launcher
+    COMMAND_TREE_HASH_PATH = os.getenv('COMMAND_TREE_HASH_PATH', './data/command_tree.sha256')
+
+    # Verified user storage: "none", "sqlite" or "mariadb"
+    STORAGE_BACKEND = os.getenv('STORAGE_BACKEND', 'none')
+    SQLITE_PATH = os.getenv('SQLITE_PATH', './data/verify.db')
+    DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', '4'))
+    DB_USER = os.getenv('DB_USER')
+    DB_PASSWORD = os.getenv('DB_PASSWORD')
+    DB_HOST = os.getenv('DB_HOST')
+    DB_PORT = int(os.getenv('DB_PORT', '3306'))
+    DB_NAME = os.getenv('DB_NAME')
+    VERIFIED_INDEX_MODE = os.getenv('VERIFIED_INDEX_MODE', 'full')  # "full" or "bloom"
+    VERIFIED_BLOOM_CAPACITY = 100000
+    VERIFIED_SYNC_INTERVAL = int(os.getenv('VERIFIED_SYNC_INTERVAL', '60'))
+    VERIFIED_FULL_SYNC_EVERY = 30
+
+    # >verify rate limits: LIMIT requests per PERIOD seconds
+    VERIFY_USER_LIMIT = int(os.getenv('VERIFY_USER_LIMIT', '5'))
+    VERIFY_USER_PERIOD = int(os.getenv('VERIFY_USER_PERIOD', '600'))
+    VERIFY_EMAIL_LIMIT = int(os.getenv('VERIFY_EMAIL_LIMIT', '3'))
+    VERIFY_EMAIL_PERIOD = int(os.getenv('VERIFY_EMAIL_PERIOD', '600'))
+    VERIFY_GLOBAL_LIMIT = int(os.getenv('VERIFY_GLOBAL_LIMIT', '300'))
+    VERIFY_GLOBAL_PERIOD = int(os.getenv('VERIFY_GLOBAL_PERIOD', '3600'))
+    # Repeating >verify within this many seconds answers with the code already sent
+    VERIFY_RESEND_COOLDOWN = int(os.getenv('VERIFY_RESEND_COOLDOWN', '60'))
+
+    # Email delivery
+    EMAIL_WORKERS = int(os.getenv('EMAIL_WORKERS', '4'))
+    EMAIL_QUEUE_SIZE = int(os.getenv('EMAIL_QUEUE_SIZE', '500'))
+    EMAIL_SHUTDOWN_TIMEOUT = 30
+    SMTP_TIMEOUT = 30
+    SMTP_POOL_SIZE = int(os.getenv('SMTP_POOL_SIZE', '4'))
+    SMTP_IDLE_TIMEOUT = int(os.getenv('SMTP_IDLE_TIMEOUT', '120'))
+    SMTP_PROBE_AFTER = 15
+    SMTP_BATCH_SIZE = 10
+
+    # Circuit breakers around SMTP and the log channel: open once BREAKER_FAILURE_RATE
+    # of the last BREAKER_WINDOW calls failed or took longer than the slow-call limit
+    BREAKER_WINDOW = 20
+    BREAKER_MIN_CALLS = 5
+    BREAKER_FAILURE_RATE = float(os.getenv('BREAKER_FAILURE_RATE', '0.5'))
+    BREAKER_OPEN_SECONDS = int(os.getenv('BREAKER_OPEN_SECONDS', '60'))
+    BREAKER_HALF_OPEN_TRIALS = 2
+    SMTP_SLOW_CALL = 10  # seconds per email
+    LOG_SLOW_CALL = 5  # seconds per log message
+
+    # Outbox of verification emails, kept on disk until they are delivered
+    OUTBOX_PATH = os.getenv('OUTBOX_PATH', './data/outbox.db')
+    OUTBOX_MAX_ATTEMPTS = int(os.getenv('OUTBOX_MAX_ATTEMPTS', '5'))
+    OUTBOX_BASE_DELAY = 2
+    OUTBOX_MAX_DELAY = 60
+    OUTBOX_DEAD_RETENTION = 7 * 24 * 3600
+
+    # Bulk role import
+    BULK_IMPORT_DIR = os.getenv('BULK_IMPORT_DIR', './data/bulk_imports')
+    BULK_IMPORT_RATE = float(os.getenv('BULK_IMPORT_RATE', '1'))  # role assignments per second
+    BULK_IMPORT_CHECKPOINT_EVERY = 10
+    BULK_IMPORT_PROGRESS_INTERVAL = 10
+
+    # Prometheus metrics endpoint
+    METRICS_ENABLED = os.getenv('METRICS_ENABLED', 'false').lower() == 'true'
+    METRICS_HOST = os.getenv('METRICS_HOST', '127.0.0.1')
+    METRICS_PORT = int(os.getenv('METRICS_PORT', '9108'))
+
+    # Process logging, written by a background thread
+    LOG_FORMAT = os.getenv('LOG_FORMAT', 'text')  # "text" or "json" (one object per line)
+    LOG_QUEUE_SIZE = int(os.getenv('LOG_QUEUE_SIZE', '10000'))
+    LOG_QUEUE_POLICY = os.getenv('LOG_QUEUE_POLICY', 'block')  # "block" or "drop" warnings when full
+    LOG_QUEUE_BLOCK_TIMEOUT = 0.5
+
+    # Local audit copy of every log channel event
+    AUDIT_ENABLED = os.getenv('AUDIT_ENABLED', 'false').lower() == 'true'
+    AUDIT_PATH = os.getenv('AUDIT_PATH', './data/audit.db')
+    AUDIT_RETENTION_DAYS = int(os.getenv('AUDIT_RETENTION_DAYS', '90'))
+
+    # Log channel
+    LOG_FLUSH_INTERVAL = float(os.getenv('LOG_FLUSH_INTERVAL', '2'))
+    LOG_BUFFER_SIZE = int(os.getenv('LOG_BUFFER_SIZE', '200'))
+    LOG_OVERFLOW_POLICY = os.getenv('LOG_OVERFLOW_POLICY', 'summarise')  # "drop" or "summarise"
+
@@ -1,10 +1,142 @@
 import smtplib
+import threading
+import time
+import logging
+from collections import deque
 from email.mime.text import MIMEText
+from typing import Optional
 from .config import Config
+from .circuit_breaker import CircuitBreaker
+
+logger = logging.getLogger('email_verification')
+
+class SMTPConnectionPool:
+    """Thread-safe pool of authenticated SMTP sessions.
+
+    Sessions are handed out most-recently-used first, NOOP-probed when they sat
+    idle for a while and closed once they exceed the idle timeout.
+    """
+
+    def __init__(self, size: int = Config.SMTP_POOL_SIZE, idle_timeout: float = Config.SMTP_IDLE_TIMEOUT,
+                 probe_after: float = Config.SMTP_PROBE_AFTER):
+        self.size = max(1, size)
+        self.idle_timeout = idle_timeout
+        self.probe_after = probe_after
+        self._idle = deque()  # (server, last_used)
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(self.size)
+        self._open = 0
+
+    @property
+    def idle_count(self) -> int:
+        return len(self._idle)
+
+    @property
+    def open_count(self) -> int:
+        return self._open
+
+    def _connect(self) -> smtplib.SMTP:
+        server = smtplib.SMTP(Config.SMTP_SERVER, Config.SMTP_PORT, timeout=Config.SMTP_TIMEOUT)
+        try:
+            if Config.SMTP_STARTTLS:
+                server.starttls()
+            # Local relays and test sinks accept mail without authentication
+            if Config.EMAIL_PASSWORD:
+                server.login(Config.SENDER_EMAIL, Config.EMAIL_PASSWORD)
+        except Exception:
+            self._close(server)
+            raise
+        with self._lock:
+            self._open += 1
+        logger.info(f"Opened SMTP session to {Config.SMTP_SERVER} ({self._open} open)")
+        return server
+
+    @staticmethod
+    def _close(server: smtplib.SMTP) -> None:
+        try:
+            server.quit()
+        except Exception:
+            try:
+                server.close()
+            except Exception:
+                pass
+
+    def _discard(self, server: smtplib.SMTP) -> None:
+        self._close(server)
+        with self._lock:
+            self._open -= 1
+
+    @staticmethod
+    def _is_alive(server: smtplib.SMTP) -> bool:
+        try:
+            return server.noop()[0] == 250
+        except Exception:
+            return False
+
+    def acquire(self) -> smtplib.SMTP:
+        """Get a live session, reusing an idle one when possible"""
+        self._slots.acquire()
+        try:
+            while True:
+                with self._lock:
+                    if not self._idle:
+                        break
+                    server, last_used = self._idle.pop()
+                idle_for = time.monotonic() - last_used
+                if idle_for > self.idle_timeout:
+                    self._discard(server)
+                    continue
+                if idle_for > self.probe_after and not self._is_alive(server):
+                    logger.info("Dropping stale SMTP session")
+                    self._discard(server)
+                    continue
+                return server
+            return self._connect()
+        except Exception:
+            self._slots.release()
+            raise
+
+    def release(self, server: Optional[smtplib.SMTP], broken: bool = False) -> None:
+        """Return a session to the pool, closing it if it is broken"""
+        try:
+            if server is None:
+                pass
+            elif broken:
+                self._discard(server)
+            else:
+                with self._lock:
+                    self._idle.append((server, time.monotonic()))
+        finally:
+            self._slots.release()
+
+    def reconnect(self, server: smtplib.SMTP) -> smtplib.SMTP:
+        """Replace a dropped session with a fresh one without giving up the slot.
+
+        The old session is closed even if reconnecting fails.
+        """
+        self._discard(server)
+        return self._connect()
+
+    def close_idle(self, max_idle: Optional[float] = None) -> None:
+        """Close idle sessions, or only those idle longer than max_idle"""
+        now = time.monotonic()
+        with self._lock:
+            keep, expired = deque(), []
+            for server, last_used in self._idle:
+                if max_idle is None or now - last_used > max_idle:
+                    expired.append(server)
+                else:
+                    keep.append((server, last_used))
+            self._idle = keep
+        for server in expired:
+            self._discard(server)
 
 class EmailService:
+    _pool = SMTPConnectionPool()
+    breaker = CircuitBreaker("smtp", slow_call=Config.SMTP_SLOW_CALL)
+
     @staticmethod
-    def send_verification_email(email: str, code: str, username: str) -> None:
+    def build_message(email: str, code: str, username: str) -> MIMEText:
         msg = MIMEText(
             "(english below)"
             f"Hallo {username},\n\n"
@@ -22,12 +154,61 @@ class EmailService:
             "Kind regards, your verification bot"
 
         )
-        
+
         msg['Subject'] = 'Discord Verifikationscode'
         msg['From'] = Config.SENDER_EMAIL
         msg['To'] = email
-        
-        with smtplib.SMTP(Config.SMTP_SERVER, Config.SMTP_PORT) as server:
-            server.starttls()
-            server.login(Config.SENDER_EMAIL, Config.EMAIL_PASSWORD)
-            server.send_message(msg)
+        return msg
+
+    @staticmethod
+    def send_verification_email(email: str, code: str, username: str) -> None:
+        error = EmailService.send_messages([EmailService.build_message(email, code, username)])[0]
+        if error is not None:
+            raise error
+
+    @staticmethod
+    def send_messages(messages: list[MIMEText]) -> list[Optional[Exception]]:
+        """Send several messages over one pooled session.
+
+        Returns one entry per message: None on success, otherwise the exception.
+        A session dropped by the server is reconnected once and the send retried.
+        """
+        pool = EmailService._pool
+        results: list[Optional[Exception]] = []
+        server = pool.acquire()
+        broken = False
+        try:
+            for index, msg in enumerate(messages):
+                try:
+                    try:
+                        server.send_message(msg)
+                    except smtplib.SMTPServerDisconnected:
+                        logger.info("SMTP session dropped by server, reconnecting")
+                        dropped, server = server, None
+                        server = pool.reconnect(dropped)
+                        server.send_message(msg)
+                    results.append(None)
+                except (smtplib.SMTPRecipientsRefused, smtplib.SMTPSenderRefused, smtplib.SMTPDataError) as e:
+                    # Rejected message, the session itself is still usable
+                    results.append(e)
+                except Exception as e:
+                    # Session is unusable, fail the rest of the batch
+                    broken = True
+                    results.extend([e] * (len(messages) - index))
+                    break
+        finally:
+            pool.release(server, broken=broken)
+        return results
+
+    @staticmethod
+    def close_pool() -> None:
+        """Close every idle SMTP session"""
+        EmailService._pool.close_idle()
+
+    @staticmethod
+    def pool_stats() -> dict:
+        return {
+            'size': EmailService._pool.size,
+            'open': EmailService._pool.open_count,
+            'idle': EmailService._pool.idle_count,
+        }
@@ -0,0 +1,91 @@
+import asyncio
+import heapq
+import itertools
+import logging
+from typing import Any, Awaitable, Callable, Hashable, Optional
+
+logger = logging.getLogger('email_verification')
+
+ExpiryCallback = Callable[[list[tuple[Hashable, Any]]], Awaitable[None]]
+
+class ExpiryScheduler:
+    """Expires keys at their deadline using one background task and a min-heap.
+
+    Scheduling is O(log n). Cancelling or rescheduling only drops the key from
+    the live table; the stale heap entry is skipped when it comes up and the
+    heap is compacted once stale entries outnumber live ones. Everything due at
+    the same wakeup is handed to the callback as one batch of (key, payload).
+    """
+
+    def __init__(self, on_expire: ExpiryCallback):
+        self.on_expire = on_expire
+        self._heap: list[tuple[float, int, Hashable]] = []
+        self._entries: dict[Hashable, tuple[float, int, Any]] = {}
+        self._sequence = itertools.count()
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._entries
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run(), name="expiry-scheduler")
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def schedule(self, key: Hashable, delay: float, payload: Any = None) -> None:
+        """Expire key after delay seconds, replacing any earlier schedule for it"""
+        deadline = asyncio.get_running_loop().time() + delay
+        seq = next(self._sequence)
+        self._entries[key] = (deadline, seq, payload)
+        heapq.heappush(self._heap, (deadline, seq, key))
+        if self._heap[0][1] == seq:
+            self._wakeup.set()
+
+    def cancel(self, key: Hashable) -> bool:
+        """Stop key from expiring, returns False if it was not scheduled"""
+        if self._entries.pop(key, None) is None:
+            return False
+        if len(self._heap) > 2 * len(self._entries) + 64:
+            self._compact()
+        return True
+
+    def _compact(self) -> None:
+        self._heap = [(deadline, seq, key) for key, (deadline, seq, _) in self._entries.items()]
+        heapq.heapify(self._heap)
+
+    def _pop_due(self, now: float) -> list[tuple[Hashable, Any]]:
+        due = []
+        while self._heap and self._heap[0][0] <= now:
+            _, seq, key = heapq.heappop(self._heap)
+            entry = self._entries.get(key)
+            if entry is None or entry[1] != seq:
+                continue  # cancelled or rescheduled
+            del self._entries[key]
+            due.append((key, entry[2]))
+        return due
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            self._wakeup.clear()
+            due = self._pop_due(loop.time())
+            if due:
+                try:
+                    await self.on_expire(due)
+                except Exception as e:
+                    logger.error(f"Error expiring {len(due)} entries: {e}", exc_info=e)
+
+            timeout = max(0.0, self._heap[0][0] - loop.time()) if self._heap else None
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
@@ -0,0 +1,36 @@
+import json
+import os
+from dataclasses import dataclass
+from .config import Config
+
+@dataclass(frozen=True)
+class GuildSettings:
+    """Verification rules of one guild, unset keys fall back to the global Config"""
+    guild_id: int
+    verified_role: str = Config.VERIFIED_ROLE_NAME
+    log_channel: str = Config.LOG_CHANNEL_NAME
+    allowed_domain: str = Config.ALLOWED_DOMAIN
+    student_pattern: str = Config.STUDENT_PATTERN
+    staff_pattern: str = Config.PROF_PATTERN
+
+def load_guild_settings(path: str = Config.GUILD_CONFIG_PATH) -> list[GuildSettings]:
+    """Settings of every guild the bot verifies for, in file order.
+
+    The file holds a JSON list of objects with the GuildSettings keys, e.g.
+    [{"guild_id": 123, "allowed_domain": "@thu.de", "verified_role": "Verified"}].
+    Without the file the single guild from GUILD_ID is used.
+    """
+    if not os.path.exists(path):
+        return [GuildSettings(int(Config.GUILD_ID))] if Config.GUILD_ID else []
+    with open(path, encoding='utf-8') as f:
+        entries = json.load(f)
+
+    settings = []
+    seen = set()
+    for entry in entries:
+        guild_settings = GuildSettings(**{**entry, 'guild_id': int(entry['guild_id'])})
+        if guild_settings.guild_id in seen:
+            raise ValueError(f"Guild {guild_settings.guild_id} is configured twice in {path}")
+        seen.add(guild_settings.guild_id)
+        settings.append(guild_settings)
+    return settings
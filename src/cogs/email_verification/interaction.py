@@ -0,0 +1,50 @@
+import discord
+
+class InteractionContext:
+    """Stands in for commands.Context when a flow starts from an interaction.
+
+    The interaction is deferred as an ephemeral "thinking" response right
+    away, and every send() edits that one response instead of posting a new
+    message, so the user sees a single reply that follows the flow.
+    """
+    prefix = "/"
+
+    def __init__(self, interaction: discord.Interaction):
+        self.interaction = interaction
+        self.bot = interaction.client
+        self.author = interaction.user
+        self.channel = interaction.channel
+        self.guild = interaction.guild
+
+    @classmethod
+    async def defer(cls, interaction: discord.Interaction) -> "InteractionContext":
+        await interaction.response.defer(ephemeral=True, thinking=True)
+        return cls(interaction)
+
+    async def send(self, content=None, *, embed=None, **kwargs):
+        edits = {'content': content}
+        if embed is not None:
+            edits['embed'] = embed
+        return await self.interaction.edit_original_response(**edits)
+
+class VerifyModal(discord.ui.Modal, title="Verifizierung"):
+    email = discord.ui.TextInput(label="THU-E-Mail-Adresse", placeholder="name12@thu.de", max_length=100)
+
+    def __init__(self, handler):
+        super().__init__()
+        self.handler = handler
+
+    async def on_submit(self, interaction: discord.Interaction):
+        ctx = await InteractionContext.defer(interaction)
+        await self.handler.verify_email(ctx, self.email.value.strip())
+
+class ConfirmModal(discord.ui.Modal, title="Verifizierung bestätigen"):
+    code = discord.ui.TextInput(label="Verifizierungscode", placeholder="A1B2C3", min_length=6, max_length=6)
+
+    def __init__(self, handler):
+        super().__init__()
+        self.handler = handler
+
+    async def on_submit(self, interaction: discord.Interaction):
+        ctx = await InteractionContext.defer(interaction)
+        await self.handler.confirm_email(ctx, self.code.value.strip())
@@ -0,0 +1,202 @@
+import asyncio
+import logging
+import time
+from collections import Counter, deque
+from typing import Optional
+import discord
+from .config import Config
+from .utils import VerificationUtils
+from .metrics import LOG_EVENTS, LOG_FLUSH_SECONDS
+
+logger = logging.getLogger('email_verification')
+
+# Discord accepts at most 10 embeds and 6000 characters of embed text per message
+MAX_EMBEDS_PER_MESSAGE = 10
+MAX_EMBED_CHARS_PER_MESSAGE = 6000
+
+class LogSink:
+    """Buffers log embeds and posts them to the log channels in batches.
+
+    Embeds are buffered per guild, as each guild has its own log channel, and
+    flushed every LOG_FLUSH_INTERVAL seconds, one message per guild, or as
+    soon as a full message worth of embeds is buffered for one guild. The
+    capacity is shared. When the buffer is full new embeds are
+    dropped; with the "summarise" policy the dropped events are reported as one
+    summary embed on the next flush to the default log channel.
+    """
+
+    def __init__(self, bot, interval: float = Config.LOG_FLUSH_INTERVAL,
+                 capacity: int = Config.LOG_BUFFER_SIZE, overflow_policy: str = Config.LOG_OVERFLOW_POLICY):
+        if overflow_policy not in ("drop", "summarise"):
+            raise ValueError(f"Unknown log overflow policy: {overflow_policy}")
+        self.bot = bot
+        self.interval = interval
+        self.capacity = max(1, capacity)
+        self.overflow_policy = overflow_policy
+        self._buffers: dict[Optional[int], deque[discord.Embed]] = {}
+        # Smaller batches for guilds whose last message was rejected as too large
+        self._batch_limits: dict[Optional[int], int] = {}
+        self._size = 0
+        self._dropped: Counter = Counter()
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    @property
+    def depth(self) -> int:
+        return self._size
+
+    def start(self) -> None:
+        if not self.running:
+            self._task = asyncio.create_task(self._run(), name="log-sink")
+
+    async def stop(self) -> None:
+        """Stop the flush loop and post everything still buffered"""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        while self._size or self._dropped:
+            if not await self.flush():
+                break
+
+    def put(self, embed: discord.Embed, guild_id: Optional[int] = None) -> None:
+        """Buffer an embed for the next flush to a guild's log channel"""
+        if self._size >= self.capacity:
+            self._dropped[embed.title or "Untitled"] += 1
+            LOG_EVENTS.labels('dropped').inc()
+            if self.overflow_policy == "drop":
+                logger.warning(f"Log buffer full, dropped event: {embed.title}")
+            return
+        buffer = self._buffers.setdefault(guild_id, deque())
+        buffer.append(embed)
+        self._size += 1
+        LOG_EVENTS.labels('buffered').inc()
+        if len(buffer) >= MAX_EMBEDS_PER_MESSAGE:
+            self._wakeup.set()
+
+    def _summary_embed(self) -> Optional[discord.Embed]:
+        if self.overflow_policy != "summarise" or not self._dropped:
+            self._dropped.clear()
+            return None
+        embed = discord.Embed(
+            title="Log Events Dropped",
+            description=f"{sum(self._dropped.values())} events were dropped because the log buffer was full",
+            color=discord.Color.dark_grey()
+        )
+        for title, count in self._dropped.most_common(25):
+            embed.add_field(name=title, value=str(count), inline=True)
+        self._dropped.clear()
+        return embed
+
+    async def flush(self) -> bool:
+        """Post one message worth of embeds to every guild with buffered ones, returns False if no log channel took any"""
+        if not self._size and (not self._dropped or self.overflow_policy != "summarise"):
+            # Nothing to post; drop counts are only reported by the "summarise" policy
+            self._dropped.clear()
+            return True
+        # Each log channel has its own breaker, so one broken channel holds up no other
+        default_id = VerificationUtils.resolver_for(self.bot).guild_id
+        guild_ids = [key for key, buffer in self._buffers.items() if buffer]
+        if self._dropped and default_id not in guild_ids:
+            guild_ids.append(default_id)
+        sent = False
+        for guild_id in guild_ids:
+            resolver = VerificationUtils.resolver_for(self.bot, guild_id)
+            breaker = resolver.log_breaker
+            if breaker.rejecting:
+                # Keep the embeds buffered; overflow is handled by put() while the breaker is open
+                continue
+            batch = self._take_batch(guild_id, guild_id == default_id)
+            if not batch:
+                continue
+
+            channel = await resolver.log_channel()
+            if channel is None:
+                # A setup problem of this guild rather than a failing Discord, so the breaker is left alone
+                LOG_EVENTS.labels('dropped').inc(len(batch))
+                logger.error(f"Could not find log channel #{resolver.log_channel_name} of guild "
+                             f"{resolver.guild_id or 'default'}, dropped {len(batch)} log events")
+                continue
+            if not breaker.allow():
+                # Half-open and out of trial calls
+                self._requeue(guild_id, batch)
+                continue
+            started = time.perf_counter()
+            try:
+                await channel.send(embeds=batch)
+            except discord.HTTPException as e:
+                if not self._is_too_large(e):
+                    breaker.record(False)
+                    logger.error(f"Failed to send {len(batch)} log messages: {e}")
+                    continue
+                # Discord is fine, the message was ours to blame
+                breaker.record(True, time.perf_counter() - started)
+                if len(batch) == 1:
+                    LOG_EVENTS.labels('dropped').inc()
+                    logger.error(f"Log message {batch[0].title!r} is too large for Discord, dropped it: {e}")
+                    continue
+                self._batch_limits[guild_id] = len(batch) // 2
+                self._requeue(guild_id, batch)
+                logger.warning(f"{len(batch)} log messages were too large for one message, sending fewer at a time")
+                # Still progress, a smaller batch goes out on the next flush
+                sent = True
+                continue
+            except Exception as e:
+                breaker.record(False)
+                logger.error(f"Failed to send {len(batch)} log messages: {e}")
+                continue
+            elapsed = time.perf_counter() - started
+            breaker.record(True, elapsed)
+            LOG_FLUSH_SECONDS.observe(elapsed)
+            self._batch_limits.pop(guild_id, None)
+            sent = True
+        return sent
+
+    def _take_batch(self, guild_id: Optional[int], with_summary: bool = False) -> list[discord.Embed]:
+        """Remove up to one message worth of a guild's embeds, the default guild also gets the drop summary"""
+        batch = []
+        chars = 0
+        if with_summary:
+            summary = self._summary_embed()
+            if summary is not None:
+                batch.append(summary)
+                chars += len(summary)
+        limit = self._batch_limits.get(guild_id, MAX_EMBEDS_PER_MESSAGE)
+        buffer = self._buffers.get(guild_id)
+        while buffer and len(batch) < limit:
+            # An embed too large on its own still goes alone, Discord reports it
+            if batch and chars + len(buffer[0]) > MAX_EMBED_CHARS_PER_MESSAGE:
+                break
+            chars += len(buffer[0])
+            batch.append(buffer.popleft())
+            self._size -= 1
+        if buffer is not None and not buffer:
+            del self._buffers[guild_id]
+        return batch
+
+    @staticmethod
+    def _is_too_large(error: discord.HTTPException) -> bool:
+        """Whether Discord rejected the message for its size rather than failing"""
+        return error.status == 413 or (error.status == 400 and error.code == 50035)
+
+    def _requeue(self, guild_id: Optional[int], batch: list[discord.Embed]) -> None:
+        self._buffers.setdefault(guild_id, deque()).extendleft(reversed(batch))
+        self._size += len(batch)
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            while self._size or self._dropped:
+                if not await self.flush() or not self._has_full_batch():
+                    break
+
+    def _has_full_batch(self) -> bool:
+        return any(len(buffer) >= MAX_EMBEDS_PER_MESSAGE for buffer in self._buffers.values())
@@ -0,0 +1,291 @@
+import asyncio
+import logging
+import random
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Callable, Optional
+from .config import Config
+from .email_service import EmailService
+from .circuit_breaker import CircuitOpenError
+from .outbox import Outbox, is_permanent
+from .metrics import EMAIL_BATCH_SECONDS, EMAIL_BATCH_SIZE, EMAILS_SENT
+
+logger = logging.getLogger('email_verification')
+
+@dataclass
+class EmailJob:
+    email: str
+    code: str
+    username: str
+    future: asyncio.Future
+    user_id: int = 0
+    outbox_id: Optional[int] = None
+    attempts: int = 0
+    created_at: float = field(default_factory=time.time)
+
+def _consume_result(future: asyncio.Future) -> None:
+    # Replayed mails have nobody waiting for them
+    if not future.cancelled():
+        future.exception()
+
+class EmailQueue:
+    """Bounded queue of outgoing verification emails, drained by a pool of send workers.
+
+    smtplib is blocking, so every send runs on a dedicated thread pool and the
+    event loop only awaits the result. A worker takes everything that is already
+    queued (up to SMTP_BATCH_SIZE) and sends it over a single pooled session.
+
+    Every mail is written to the Outbox first. A failed send is retried with
+    exponential backoff and jitter until it succeeds, fails permanently, runs
+    out of attempts or its code would have expired; then it becomes a dead
+    letter and its future fails. Mails still in the outbox at startup are
+    replayed if `is_wanted(user_id, code)` says their code is still pending.
+    """
+
+    def __init__(self, workers: int = Config.EMAIL_WORKERS, maxsize: int = Config.EMAIL_QUEUE_SIZE,
+                 is_wanted: Optional[Callable[[int, str], bool]] = None, default_guild_id: Optional[int] = None):
+        self.worker_count = max(1, workers)
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=maxsize)
+        self.is_wanted = is_wanted
+        self.default_guild_id = default_guild_id
+        self.outbox: Optional[Outbox] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._workers: list[asyncio.Task] = []
+        self._retries: dict[int, tuple[asyncio.TimerHandle, EmailJob]] = {}
+        self._writes: set[asyncio.Task] = set()
+
+    @property
+    def running(self) -> bool:
+        return bool(self._workers)
+
+    async def start(self) -> None:
+        """Start the send workers"""
+        if self.running:
+            return
+        self._executor = ThreadPoolExecutor(max_workers=self.worker_count, thread_name_prefix="smtp-worker")
+        self.outbox = Outbox(default_guild_id=self.default_guild_id)
+        await self.outbox.setup()
+        await self._replay()
+        self._workers = [
+            asyncio.create_task(self._worker(i), name=f"email-worker-{i}")
+            for i in range(self.worker_count)
+        ]
+        logger.info(f"Started email queue with {self.worker_count} workers")
+
+    async def stop(self, timeout: float = Config.EMAIL_SHUTDOWN_TIMEOUT) -> None:
+        """Let queued emails drain, then stop the workers"""
+        if not self.running:
+            return
+        try:
+            await asyncio.wait_for(self.queue.join(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"Email queue did not drain within {timeout}s, {self.queue.qsize()} emails dropped")
+
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+        # Mails waiting for a retry stay in the outbox and are replayed on the next start
+        for handle, job in self._retries.values():
+            handle.cancel()
+            if not job.future.done():
+                job.future.cancel()
+        self._retries.clear()
+
+        while not self.queue.empty():
+            job = self.queue.get_nowait()
+            if not job.future.done():
+                job.future.cancel()
+            self.queue.task_done()
+
+        self._executor.shutdown(wait=False)
+        self._executor = None
+        await asyncio.gather(*self._writes, return_exceptions=True)
+        await self.outbox.close()
+        self.outbox = None
+        EmailService.close_pool()
+        logger.info("Stopped email queue")
+
+    @property
+    def retrying(self) -> int:
+        return len(self._retries)
+
+    async def submit(self, email: str, code: str, username: str, user_id: int = 0,
+                     guild_id: Optional[int] = None) -> asyncio.Future:
+        """Queue a verification email and return a future resolved once it was delivered.
+
+        Raises asyncio.QueueFull if the queue is at capacity.
+        """
+        if self.queue.full():
+            raise asyncio.QueueFull
+        job = EmailJob(email, code, username, asyncio.get_running_loop().create_future(), user_id)
+        job.outbox_id = await self.outbox.add(user_id, email, code, username, job.created_at, guild_id)
+        try:
+            self.queue.put_nowait(job)
+        except asyncio.QueueFull:
+            # Filled up while the mail was written to the outbox
+            self._write(self.outbox.complete([job.outbox_id]))
+            raise
+        return job.future
+
+    def _write(self, update) -> None:
+        """Run an outbox update in the background, the outbox keeps its queries in order"""
+        task = asyncio.create_task(update)
+        self._writes.add(task)
+        task.add_done_callback(self._write_done)
+
+    def _write_done(self, task: asyncio.Task) -> None:
+        self._writes.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logger.error(f"Failed to update the outbox: {task.exception()}")
+
+    async def _replay(self) -> None:
+        """Queue the mails a previous run left in the outbox"""
+        purged = await self.outbox.purge_dead()
+        if purged:
+            logger.info(f"Purged {purged} old dead letters from the outbox")
+        loop = asyncio.get_running_loop()
+        replayed = 0
+        for outbox_id, user_id, email, code, username, attempts, created_at in await self.outbox.pending():
+            if self.is_wanted is not None and not self.is_wanted(user_id, code):
+                await self.outbox.bury(outbox_id, attempts, RuntimeError("Verification no longer pending after restart"))
+                continue
+            future = loop.create_future()
+            future.add_done_callback(_consume_result)
+            job = EmailJob(email, code, username, future, user_id, outbox_id, attempts, created_at)
+            try:
+                self.queue.put_nowait(job)
+            except asyncio.QueueFull:
+                self._schedule_retry(job, Config.OUTBOX_BASE_DELAY)
+            replayed += 1
+        if replayed:
+            logger.info(f"Replaying {replayed} emails from the outbox")
+
+    def retry_delay(self, job: EmailJob, error: Exception) -> Optional[float]:
+        """Seconds until the next attempt, None if the mail should not be retried"""
+        if is_permanent(error) or job.attempts >= Config.OUTBOX_MAX_ATTEMPTS:
+            return None
+        backoff = min(Config.OUTBOX_MAX_DELAY, Config.OUTBOX_BASE_DELAY * 2 ** (job.attempts - 1))
+        delay = backoff / 2 + random.uniform(0, backoff / 2)
+        if time.time() + delay > job.created_at + Config.VERIFICATION_TIMEOUT:
+            # The code would have expired by the time it arrives
+            return None
+        return delay
+
+    def _schedule_retry(self, job: EmailJob, delay: float) -> None:
+        handle = asyncio.get_running_loop().call_later(delay, self._requeue, job)
+        self._retries[job.outbox_id] = (handle, job)
+
+    def _requeue(self, job: EmailJob) -> None:
+        self._retries.pop(job.outbox_id, None)
+        if job.future.done():
+            return
+        if self.is_wanted is not None and not self.is_wanted(job.user_id, job.code):
+            # Superseded by a newer code or already expired
+            self._write(self.outbox.complete([job.outbox_id]))
+            job.future.cancel()
+            return
+        try:
+            self.queue.put_nowait(job)
+        except asyncio.QueueFull:
+            self._schedule_retry(job, Config.OUTBOX_BASE_DELAY)
+
+    def _handle_failure(self, job: EmailJob, error: Exception, worker_id: int) -> None:
+        job.attempts += 1
+        delay = self.retry_delay(job, error)
+        if delay is not None:
+            logger.warning(f"Email worker {worker_id} failed to send to {job.email} "
+                           f"(attempt {job.attempts}), retrying in {delay:.1f}s: {error}")
+            self._write(self.outbox.record_failure(job.outbox_id, job.attempts, error))
+            self._schedule_retry(job, delay)
+            return
+        self._give_up(job, error, worker_id)
+
+    def _give_up(self, job: EmailJob, error: Exception, worker_id: int) -> None:
+        EMAILS_SENT.labels('dead').inc()
+        logger.error(f"Email worker {worker_id} gave up sending to {job.email} after {job.attempts} attempt(s): {error}")
+        self._write(self.outbox.bury(job.outbox_id, job.attempts, error))
+        job.future.set_exception(error)
+
+    def _hold(self, job: EmailJob, worker_id: int) -> None:
+        """Park a mail without using up an attempt while the SMTP breaker is open"""
+        delay = EmailService.breaker.retry_after() + random.uniform(0, Config.OUTBOX_BASE_DELAY)
+        if time.time() + delay > job.created_at + Config.VERIFICATION_TIMEOUT:
+            self._give_up(job, CircuitOpenError("SMTP circuit breaker is open"), worker_id)
+        else:
+            self._schedule_retry(job, delay)
+
+    async def stats(self, guild_id: int) -> dict:
+        """Queue sizes of this process, outbox counts of a guild"""
+        counts = await self.outbox.counts(guild_id) if self.outbox is not None else {'pending': 0, 'dead': 0}
+        return {
+            'queued': self.queue.qsize(),
+            'retrying': self.retrying,
+            'outbox': counts['pending'],
+            'dead': counts['dead'],
+        }
+
+    def _next_batch(self, first: EmailJob) -> list[EmailJob]:
+        """Take whatever else is already queued, up to the batch size"""
+        batch = [first]
+        while len(batch) < Config.SMTP_BATCH_SIZE and not self.queue.empty():
+            batch.append(self.queue.get_nowait())
+        return batch
+
+    async def _worker(self, worker_id: int) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = self._next_batch(await self.queue.get())
+            try:
+                jobs = [job for job in batch if not job.future.cancelled()]
+                if not jobs:
+                    continue
+                if not EmailService.breaker.allow():
+                    for job in jobs:
+                        self._hold(job, worker_id)
+                    continue
+                messages = [EmailService.build_message(job.email, job.code, job.username) for job in jobs]
+                EMAIL_BATCH_SIZE.observe(len(messages))
+                started = time.perf_counter()
+                try:
+                    results = await loop.run_in_executor(self._executor, EmailService.send_messages, messages)
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    results = [e] * len(jobs)
+                elapsed = time.perf_counter() - started
+                EMAIL_BATCH_SECONDS.observe(elapsed)
+                # A rejected address says nothing about the server's health
+                healthy = all(error is None or is_permanent(error) for error in results)
+                EmailService.breaker.record(healthy, elapsed / len(messages))
+
+                delivered = []
+                try:
+                    for job, error in zip(jobs, results):
+                        if job.future.done():
+                            continue
+                        if error is None:
+                            EMAILS_SENT.labels('sent').inc()
+                            delivered.append(job)
+                        else:
+                            EMAILS_SENT.labels('failed').inc()
+                            self._handle_failure(job, error, worker_id)
+                    await self.outbox.complete([job.outbox_id for job in delivered])
+                except sqlite3.Error as e:
+                    logger.error(f"Email worker {worker_id} failed to update the outbox: {e}")
+                    for job in jobs:
+                        if job not in delivered and job.outbox_id not in self._retries and not job.future.done():
+                            job.future.set_exception(e)
+                for job in delivered:
+                    job.future.set_result(None)
+            except asyncio.CancelledError:
+                for job in batch:
+                    if not job.future.done():
+                        job.future.cancel()
+                raise
+            finally:
+                for _ in batch:
+                    self.queue.task_done()
@@ -0,0 +1,217 @@
+import bisect
+import logging
+import time
+from typing import Callable, Optional
+from aiohttp import web
+from .config import Config
+
+logger = logging.getLogger('email_verification')
+
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+def _format_labels(labelnames: tuple, values: tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{value}"' for name, value in zip(labelnames, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+class _Metric:
+    type = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: dict[tuple, object] = {}
+
+    def labels(self, *values):
+        child = self._children.get(values)
+        if child is None:
+            child = self._children[values] = self._new_child()
+        return child
+
+    def _sample_name(self) -> str:
+        return self.name
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def render(self) -> list[str]:
+        name = self._sample_name()
+        lines = [f"# HELP {name} {self.documentation}", f"# TYPE {name} {self.type}"]
+        for values, child in sorted(self._children.items()):
+            lines.extend(self._render_child(values, child))
+        return lines
+
+class _CounterChild:
+    __slots__ = ('value',)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def inc(self, amount: float = 1) -> None:
+        self.value += amount
+
+class Counter(_Metric):
+    type = "counter"
+
+    def _sample_name(self) -> str:
+        return f"{self.name}_total"
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount: float = 1) -> None:
+        self.labels().inc(amount)
+
+    def _render_child(self, values, child):
+        return [f"{self.name}_total{_format_labels(self.labelnames, values)} {child.value}"]
+
+class _HistogramChild:
+    __slots__ = ('upper_bounds', 'counts', 'sum')
+
+    def __init__(self, upper_bounds: tuple):
+        self.upper_bounds = upper_bounds
+        self.counts = [0] * (len(upper_bounds) + 1)
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.upper_bounds, value)] += 1
+        self.sum += value
+
+    def time(self) -> "_Timer":
+        return _Timer(self.observe)
+
+class _Timer:
+    __slots__ = ('_observe', '_start')
+
+    def __init__(self, observe: Callable[[float], None]):
+        self._observe = observe
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self._observe(time.perf_counter() - self._start)
+
+class Histogram(_Metric):
+    type = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = (), buckets: tuple = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value: float) -> None:
+        self.labels().observe(value)
+
+    def time(self) -> _Timer:
+        return self.labels().time()
+
+    def _render_child(self, values, child):
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float("inf"),), child.counts):
+            cumulative += count
+            le = "+Inf" if bound == float("inf") else repr(bound)
+            bucket_labels = _format_labels(self.labelnames, values, f'le="{le}"')
+            lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+        labels = _format_labels(self.labelnames, values)
+        lines.append(f"{self.name}_sum{labels} {child.sum}")
+        lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+class Gauge(_Metric):
+    """Gauge whose value is read from a callback at scrape time"""
+    type = "gauge"
+
+    def __init__(self, name: str, documentation: str):
+        super().__init__(name, documentation)
+        self._function: Optional[Callable[[], float]] = None
+
+    def set_function(self, function: Optional[Callable[[], float]]) -> None:
+        self._function = function
+
+    def render(self) -> list[str]:
+        if self._function is None:
+            return []
+        try:
+            value = float(self._function())
+        except Exception as e:
+            logger.warning(f"Failed to read gauge {self.name}: {e}")
+            return []
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type}", f"{self.name} {value}"]
+
+class Registry:
+    def __init__(self):
+        self._metrics: list[_Metric] = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+class StageTimer:
+    """Records the time between consecutive marks as stages of one histogram"""
+    __slots__ = ('histogram', '_last')
+
+    def __init__(self, histogram: Histogram):
+        self.histogram = histogram
+        self._last = time.perf_counter()
+
+    def mark(self, stage: str) -> None:
+        now = time.perf_counter()
+        self.histogram.labels(stage).observe(now - self._last)
+        self._last = now
+
+REGISTRY = Registry()
+
+VERIFY_REQUESTS = REGISTRY.register(Counter("verify_requests", ">verify requests by outcome", ("outcome",)))
+VERIFY_STAGE_SECONDS = REGISTRY.register(Histogram("verify_stage_seconds", "Time spent in each >verify stage", ("stage",)))
+CONFIRM_REQUESTS = REGISTRY.register(Counter("confirm_requests", ">confirm requests by outcome", ("outcome",)))
+CONFIRM_STAGE_SECONDS = REGISTRY.register(Histogram("confirm_stage_seconds", "Time spent in each >confirm stage", ("stage",)))
+EMAILS_SENT = REGISTRY.register(Counter("emails_sent", "Verification emails by delivery result", ("result",)))
+EMAIL_BATCH_SECONDS = REGISTRY.register(Histogram("email_batch_seconds", "Time to send one batch of emails over SMTP"))
+EMAIL_BATCH_SIZE = REGISTRY.register(Histogram("email_batch_size", "Emails per SMTP batch", buckets=(1, 2, 5, 10, 20, 50)))
+LOG_EVENTS = REGISTRY.register(Counter("log_events", "Log channel events by how they were handled", ("result",)))
+LOG_FLUSH_SECONDS = REGISTRY.register(Histogram("log_flush_seconds", "Time to post one batch of log embeds"))
+PENDING_VERIFICATIONS = REGISTRY.register(Gauge("pending_verifications", "Pending verification codes"))
+EMAIL_QUEUE_DEPTH = REGISTRY.register(Gauge("email_queue_depth", "Emails waiting to be sent"))
+LOG_BUFFER_DEPTH = REGISTRY.register(Gauge("log_buffer_depth", "Log embeds waiting to be posted"))
+EXPIRY_SCHEDULED = REGISTRY.register(Gauge("expiry_scheduled", "Verification codes scheduled to expire"))
+
+class MetricsServer:
+    """Serves REGISTRY in Prometheus text format on METRICS_HOST:METRICS_PORT.
+
+    Each bot process listens on METRICS_PORT plus its PROCESS_INDEX.
+    """
+
+    def __init__(self, host: str = Config.METRICS_HOST, port: int = Config.METRICS_PORT + Config.PROCESS_INDEX):
+        self.host = host
+        self.port = port
+        self._runner = None
+
+    async def start(self) -> None:
+        async def handle(request):
+            return web.Response(text=REGISTRY.render(), content_type="text/plain", charset="utf-8",
+                                headers={"X-Content-Type-Options": "nosniff"})
+
+        app = web.Application()
+        app.router.add_get("/metrics", handle)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self.host, self.port).start()
+        logger.info(f"Serving metrics on http://{self.host}:{self.port}/metrics")
+
+    async def stop(self) -> None:
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
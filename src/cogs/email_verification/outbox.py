@@ -0,0 +1,173 @@
+import asyncio
+import smtplib
+import time
+from typing import Optional
+from .config import Config
+from .verification_storage import SQLiteBackend
+
+SCHEMA = (
+    """CREATE TABLE IF NOT EXISTS outbox (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        owner INTEGER NOT NULL,
+        user_id INTEGER NOT NULL,
+        email TEXT NOT NULL,
+        code TEXT NOT NULL,
+        username TEXT NOT NULL,
+        attempts INTEGER NOT NULL DEFAULT 0,
+        status TEXT NOT NULL DEFAULT 'pending',
+        last_error TEXT,
+        created_at REAL NOT NULL,
+        updated_at REAL NOT NULL,
+        guild_id INTEGER
+    )""",
+    "CREATE INDEX IF NOT EXISTS idx_outbox_status ON outbox (status, owner, updated_at)",
+)
+
+def is_permanent(error: Exception) -> bool:
+    """Whether sending again cannot help, e.g. the server rejected the address"""
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return True
+    if isinstance(error, smtplib.SMTPAuthenticationError):
+        # Our credentials, not the message; mails should survive until it is fixed
+        return False
+    return isinstance(error, smtplib.SMTPResponseException) and 500 <= error.smtp_code < 600
+
+class Outbox:
+    """Verification emails kept in SQLite from submission until delivery.
+
+    Delivered mails are deleted. Mails that failed for good are kept as dead
+    letters with their last error, but without the code, for OUTBOX_DEAD_RETENTION
+    seconds. Rows are tagged with the process that owns them, so several bot
+    processes can share one file and each replays only its own mails. Dead
+    letters are shown per guild, as they name the address.
+    Queries run on a backend with a single connection, so they happen in the
+    order they were made. Mails added in the same event loop iteration are
+    inserted together in one transaction.
+    """
+
+    def __init__(self, path: str = Config.OUTBOX_PATH, owner: int = Config.PROCESS_INDEX,
+                 default_guild_id: Optional[int] = None):
+        self.path = path
+        self.default_guild_id = default_guild_id
+        self.owner = owner
+        self.db = SQLiteBackend(path, pool_size=1)
+        self._adds: list[tuple[tuple, asyncio.Future]] = []
+        self._inserts: set[asyncio.Task] = set()
+
+    async def setup(self) -> None:
+        def create(conn):
+            for statement in SCHEMA:
+                conn.execute(statement)
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(outbox)").fetchall()}
+            if "guild_id" not in columns:
+                # Mails from before multi-guild support were all for the default guild
+                conn.execute("ALTER TABLE outbox ADD COLUMN guild_id INTEGER")
+                conn.execute("UPDATE outbox SET guild_id = ?", (self.default_guild_id,))
+
+        await self.db.run(create)
+
+    async def add(self, user_id: int, email: str, code: str, username: str, created_at: float,
+                  guild_id: Optional[int] = None) -> int:
+        """Store a mail, returns its outbox id"""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._adds.append(((self.owner, user_id, email, code, username, created_at, created_at, guild_id), future))
+        if len(self._adds) == 1:
+            # Starts on the next loop iteration, after the other adds of this one
+            task = asyncio.create_task(self._insert())
+            self._inserts.add(task)
+            task.add_done_callback(self._inserts.discard)
+        return await future
+
+    async def _insert(self) -> None:
+        adds, self._adds = self._adds, []
+
+        def insert(conn):
+            return [conn.execute(
+                "INSERT INTO outbox (owner, user_id, email, code, username, created_at, updated_at, guild_id) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                row
+            ).lastrowid for row, _ in adds]
+
+        try:
+            ids = await self.db.run(insert)
+        except Exception as e:
+            for _, future in adds:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (_, future), outbox_id in zip(adds, ids):
+            if not future.done():
+                future.set_result(outbox_id)
+
+    async def complete(self, ids: list[int]) -> None:
+        """Forget delivered mails"""
+        def complete(conn):
+            conn.conn.executemany("DELETE FROM outbox WHERE id = ?", [(outbox_id,) for outbox_id in ids])
+
+        if ids:
+            await self.db.run(complete)
+
+    async def record_failure(self, outbox_id: int, attempts: int, error: Exception) -> None:
+        def record(conn):
+            conn.execute(
+                "UPDATE outbox SET attempts = ?, last_error = ?, updated_at = ? WHERE id = ?",
+                (attempts, str(error) or type(error).__name__, time.time(), outbox_id)
+            )
+
+        await self.db.run(record)
+
+    async def bury(self, outbox_id: int, attempts: int, error: Exception) -> None:
+        """Move a mail to the dead letters"""
+        def bury(conn):
+            conn.execute(
+                "UPDATE outbox SET status = 'dead', code = '', attempts = ?, last_error = ?, updated_at = ? "
+                "WHERE id = ?",
+                (attempts, str(error) or type(error).__name__, time.time(), outbox_id)
+            )
+
+        await self.db.run(bury)
+
+    async def pending(self) -> list[tuple]:
+        """(id, user_id, email, code, username, attempts, created_at) of this process's undelivered mails"""
+        def load(conn):
+            return conn.execute(
+                "SELECT id, user_id, email, code, username, attempts, created_at FROM outbox "
+                "WHERE status = 'pending' AND owner = ? ORDER BY id",
+                (self.owner,)
+            ).fetchall()
+
+        return await self.db.run(load)
+
+    async def dead_letters(self, guild_id: int, limit: int = 5) -> list[tuple]:
+        """(email, attempts, last_error, updated_at) of a guild's most recent dead letters"""
+        def load(conn):
+            return conn.execute(
+                "SELECT email, attempts, last_error, updated_at FROM outbox "
+                "WHERE status = 'dead' AND guild_id = ? ORDER BY updated_at DESC LIMIT ?",
+                (guild_id, limit)
+            ).fetchall()
+
+        return await self.db.run(load)
+
+    async def purge_dead(self, retention: float = Config.OUTBOX_DEAD_RETENTION) -> int:
+        def purge(conn):
+            return conn.execute(
+                "DELETE FROM outbox WHERE status = 'dead' AND updated_at < ?", (time.time() - retention,)
+            ).rowcount
+
+        return await self.db.run(purge)
+
+    async def counts(self, guild_id: int) -> dict:
+        """Undelivered mails and dead letters of a guild"""
+        def count(conn):
+            return dict(conn.execute(
+                "SELECT status, COUNT(*) FROM outbox WHERE guild_id = ? GROUP BY status", (guild_id,)
+            ).fetchall())
+
+        counts = await self.db.run(count)
+        return {'pending': counts.get('pending', 0), 'dead': counts.get('dead', 0)}
+
+    async def close(self) -> None:
+        await asyncio.gather(*self._inserts, return_exceptions=True)
+        await self.db.close()
@@ -0,0 +1,134 @@
+import sys
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Optional
+from .config import Config
+
+class EmailPendingError(Exception):
+    """Another user has a live code for the address"""
+
+    def __init__(self, owner_id: int):
+        super().__init__(f"Email has a pending verification of user {owner_id}")
+        self.owner_id = owner_id
+
+@dataclass(slots=True)
+class PendingVerification:
+    email: str
+    code: str
+    attempts: int = 0
+    created_at: float = field(default_factory=time.monotonic)
+    guild_id: Optional[int] = None
+
+    def age(self) -> float:
+        return time.monotonic() - self.created_at
+
+class PendingVerificationStore:
+    """Bounded store of pending verifications keyed by user id.
+
+    Entries are kept in LRU order. Once the store is full the least recently
+    used entry is evicted to make room. Timestamps come from the monotonic
+    clock, so wall-clock changes cannot expire or extend a code. An index from
+    address to user keeps one address from having codes on several accounts.
+    """
+
+    def __init__(self, capacity: int = Config.PENDING_CAPACITY, ttl: float = Config.VERIFICATION_TIMEOUT):
+        self.capacity = max(1, capacity)
+        self.ttl = ttl
+        self._entries: OrderedDict[int, PendingVerification] = OrderedDict()
+        self._by_email: dict[str, int] = {}
+        self.evictions = 0
+        self.expirations = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, user_id: int) -> bool:
+        return user_id in self._entries
+
+    def is_expired(self, verification: PendingVerification) -> bool:
+        return verification.age() > self.ttl
+
+    def get(self, user_id: int) -> Optional[PendingVerification]:
+        """Get a pending verification, marking it as recently used"""
+        verification = self._entries.get(user_id)
+        if verification is not None:
+            self._entries.move_to_end(user_id)
+        return verification
+
+    def owner_of(self, email: str) -> Optional[int]:
+        """User with a live code for the address"""
+        user_id = self._by_email.get(email.lower())
+        if user_id is None:
+            return None
+        verification = self._entries.get(user_id)
+        if verification is None or self.is_expired(verification):
+            return None
+        return user_id
+
+    def _unindex(self, user_id: int, verification: PendingVerification) -> None:
+        key = verification.email.lower()
+        if self._by_email.get(key) == user_id:
+            del self._by_email[key]
+
+    def put(self, user_id: int, email: str, code: str, guild_id: Optional[int] = None) -> PendingVerification:
+        """Store a new pending verification, replacing any previous one for the user.
+
+        Raises EmailPendingError if another user has a live code for the address.
+        """
+        owner_id = self.owner_of(email)
+        if owner_id is not None and owner_id != user_id:
+            raise EmailPendingError(owner_id)
+        previous = self._entries.pop(user_id, None)
+        if previous is not None:
+            self._unindex(user_id, previous)
+        while len(self._entries) >= self.capacity:
+            evicted_id, evicted = self._entries.popitem(last=False)
+            self._unindex(evicted_id, evicted)
+            if self.is_expired(evicted):
+                self.expirations += 1
+            else:
+                self.evictions += 1
+        verification = PendingVerification(email, code, guild_id=guild_id)
+        self._entries[user_id] = verification
+        self._by_email[email.lower()] = user_id
+        return verification
+
+    def add_attempt(self, user_id: int) -> int:
+        """Count a failed confirmation, returns the attempts so far"""
+        verification = self._entries.get(user_id)
+        if verification is None:
+            return 0
+        verification.attempts += 1
+        return verification.attempts
+
+    def delete(self, user_id: int) -> Optional[PendingVerification]:
+        verification = self._entries.pop(user_id, None)
+        if verification is not None:
+            self._unindex(user_id, verification)
+        return verification
+
+    def expire(self, user_id: int) -> Optional[PendingVerification]:
+        """Remove an entry that ran out of time"""
+        verification = self._entries.pop(user_id, None)
+        if verification is not None:
+            self._unindex(user_id, verification)
+            self.expirations += 1
+        return verification
+
+    def memory_usage(self) -> int:
+        """Approximate memory held by the store in bytes"""
+        total = sys.getsizeof(self._entries) + sys.getsizeof(self._by_email)
+        for user_id, verification in self._entries.items():
+            total += (sys.getsizeof(user_id) + sys.getsizeof(verification)
+                      + sys.getsizeof(verification.email) + sys.getsizeof(verification.code))
+        return total
+
+    def stats(self) -> dict:
+        return {
+            'entries': len(self._entries),
+            'capacity': self.capacity,
+            'evictions': self.evictions,
+            'expirations': self.expirations,
+            'memory_bytes': self.memory_usage(),
+        }
@@ -0,0 +1,161 @@
+import asyncio
+import logging
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+
+MAX_WINDOW = 600
+
+def _short_path(filename: str) -> str:
+    """Path relative to the bot, or package/module for library code"""
+    if filename.startswith("<"):
+        return filename
+    cwd = os.getcwd()
+    if filename.startswith(cwd + os.sep):
+        return os.path.relpath(filename, cwd)
+    return "/".join(filename.replace(os.sep, "/").split("/")[-2:])
+
+def _location(frame, line: bool = True) -> str:
+    code = frame.f_code
+    return f"{_short_path(code.co_filename)}:{frame.f_lineno if line else code.co_firstlineno} {code.co_name}"
+
+class SamplingProfiler:
+    """Statistical profiler for the event loop thread.
+
+    A background thread looks at the loop thread's current stack every
+    `interval` seconds and counts the line being executed (self time) and
+    every function on the stack (total time). Nothing runs while stopped.
+    """
+
+    def __init__(self, interval: float = 0.005):
+        self.interval = interval
+        self.samples = 0
+        self.self_counts: Counter = Counter()
+        self.total_counts: Counter = Counter()
+        self._target = None
+        self._thread = None
+        self._stop = threading.Event()
+
+    def start(self) -> None:
+        """Start sampling the calling thread"""
+        self._target = threading.get_ident()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self._target)
+            if frame is None:
+                continue
+            self.samples += 1
+            self.self_counts[_location(frame)] += 1
+            seen = set()
+            while frame is not None:
+                function = _location(frame, line=False)
+                if function not in seen:
+                    seen.add(function)
+                    self.total_counts[function] += 1
+                frame = frame.f_back
+
+    def report(self, limit: int) -> list[str]:
+        def rows(counts: Counter):
+            return [f"{100 * count / self.samples:5.1f}%  {where}" for where, count in counts.most_common(limit)]
+
+        if not self.samples:
+            return ["No samples"]
+        return ([f"{self.samples} samples every {self.interval * 1000:.0f} ms", "", "Self time:"]
+                + rows(self.self_counts) + ["", "Total time:"] + rows(self.total_counts))
+
+class _SlowCallbackHandler(logging.Handler):
+    """Collects the "Executing ... took ... seconds" warnings of asyncio debug mode"""
+
+    def __init__(self):
+        super().__init__(logging.WARNING)
+        self.callbacks: list[tuple[float, str]] = []
+
+    def emit(self, record: logging.LogRecord) -> None:
+        if record.msg == 'Executing %s took %.3f seconds':
+            handle, duration = record.args
+            self.callbacks.append((duration, str(handle)))
+
+async def measure_loop_lag(seconds: float, interval: float = 0.05, slow_callback: float = 0.05) -> list[str]:
+    """Measure how late the loop wakes up and which callbacks block it.
+
+    asyncio debug mode, which reports slow callbacks, is only switched on
+    for the duration of the window.
+    """
+    loop = asyncio.get_running_loop()
+    asyncio_logger = logging.getLogger('asyncio')
+    handler = _SlowCallbackHandler()
+    previous = (loop.get_debug(), loop.slow_callback_duration)
+    asyncio_logger.addHandler(handler)
+    loop.set_debug(True)
+    loop.slow_callback_duration = slow_callback
+
+    lags = []
+    deadline = loop.time() + seconds
+    try:
+        while loop.time() < deadline:
+            started = loop.time()
+            await asyncio.sleep(interval)
+            lags.append(max(0.0, loop.time() - started - interval))
+    finally:
+        loop.set_debug(previous[0])
+        loop.slow_callback_duration = previous[1]
+        asyncio_logger.removeHandler(handler)
+
+    lags.sort()
+    def percentile(fraction: float) -> float:
+        return lags[min(len(lags) - 1, int(fraction * len(lags)))] * 1000 if lags else 0.0
+
+    # The same task shows up once per slow step, so group them
+    slow: dict[str, list[float]] = {}
+    for duration, callback in handler.callbacks:
+        slow.setdefault(callback.split(" wait_for=")[0][:200], []).append(duration)
+
+    lines = [f"{len(lags)} samples every {interval * 1000:.0f} ms",
+             f"Lag p50 {percentile(0.5):.1f} ms, p99 {percentile(0.99):.1f} ms, max {percentile(1.0):.1f} ms",
+             "", f"Callbacks slower than {slow_callback * 1000:.0f} ms: {len(handler.callbacks)}"]
+    for callback, durations in sorted(slow.items(), key=lambda item: sum(item[1]), reverse=True):
+        lines.append(f"{len(durations):4}x max {max(durations) * 1000:7.1f} ms  {callback}")
+    return lines
+
+async def track_allocations(seconds: float, limit: int, frames: int = 1) -> list[str]:
+    """Allocation sites of memory allocated during the window and still alive at its end"""
+    if tracemalloc.is_tracing():
+        raise RuntimeError("tracemalloc is already running")
+    tracemalloc.start(frames)
+    try:
+        await asyncio.sleep(seconds)
+        snapshot = tracemalloc.take_snapshot()
+        traced, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    snapshot = snapshot.filter_traces((
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    ))
+    lines = [f"Traced {traced / 1024:.1f} KiB, peak {peak / 1024:.1f} KiB", ""]
+    for stat in snapshot.statistics('lineno')[:limit]:
+        frame = stat.traceback[0]
+        lines.append(f"{stat.size / 1024:9.1f} KiB {stat.count:7} blocks  {_short_path(frame.filename)}:{frame.lineno}")
+    return lines
+
+async def profile(seconds: float, limit: int) -> list[str]:
+    profiler = SamplingProfiler()
+    started = time.perf_counter()
+    profiler.start()
+    try:
+        await asyncio.sleep(seconds)
+    finally:
+        profiler.stop()
+    return [f"Profiled {time.perf_counter() - started:.1f}s"] + profiler.report(limit)
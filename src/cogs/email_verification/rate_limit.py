@@ -0,0 +1,110 @@
+import time
+from collections import Counter, OrderedDict
+from typing import Hashable, Optional
+from .config import Config
+
+class TokenBucket:
+    __slots__ = ('tokens', 'updated')
+
+    def __init__(self, tokens: float, updated: float):
+        self.tokens = tokens
+        self.updated = updated
+
+class RateLimiter:
+    """Token buckets keyed by an arbitrary key.
+
+    Each bucket holds up to `capacity` tokens and refills at capacity/period
+    tokens per second. Only the most recently used `max_keys` buckets are kept;
+    a bucket that was dropped simply starts out full again.
+    """
+
+    def __init__(self, capacity: int, period: float, max_keys: int = 100000):
+        self.capacity = max(1, capacity)
+        self.rate = self.capacity / period
+        self.max_keys = max_keys
+        self._buckets: OrderedDict[Hashable, TokenBucket] = OrderedDict()
+
+    def _bucket(self, key: Hashable, now: float) -> TokenBucket:
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = TokenBucket(self.capacity, now)
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        else:
+            bucket.tokens = min(self.capacity, bucket.tokens + (now - bucket.updated) * self.rate)
+            bucket.updated = now
+            self._buckets.move_to_end(key)
+        return bucket
+
+    def retry_after(self, key: Hashable, now: Optional[float] = None) -> float:
+        """Seconds until key has a token, 0 if one is available now"""
+        bucket = self._bucket(key, time.monotonic() if now is None else now)
+        if bucket.tokens >= 1:
+            return 0.0
+        return (1 - bucket.tokens) / self.rate
+
+    def consume(self, key: Hashable, now: Optional[float] = None) -> None:
+        bucket = self._bucket(key, time.monotonic() if now is None else now)
+        bucket.tokens -= 1
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+class VerifyRateLimits:
+    """Per-user, per-email and global limits in front of >verify"""
+    clock = staticmethod(time.monotonic)
+
+    def __init__(self):
+        self.limiters = {
+            'user': self._limiter('user', Config.VERIFY_USER_LIMIT, Config.VERIFY_USER_PERIOD),
+            'email': self._limiter('email', Config.VERIFY_EMAIL_LIMIT, Config.VERIFY_EMAIL_PERIOD),
+            'global': self._limiter('global', Config.VERIFY_GLOBAL_LIMIT, Config.VERIFY_GLOBAL_PERIOD),
+        }
+        self.rejections = Counter()
+        self.allowed = 0
+
+    def _limiter(self, name: str, capacity: int, period: float) -> RateLimiter:
+        return RateLimiter(capacity, period)
+
+    def check(self, user_id: int, email: str) -> tuple[Optional[str], float]:
+        """Take a token from the user's bucket, or none if any bucket is empty.
+
+        The email and global buckets are only looked at; their tokens are taken
+        by take_send() right before a mail is queued, so requests rejected on
+        the way there cost no SMTP quota. Returns (None, 0) if the request is
+        allowed, otherwise the name of the limit that was hit and the seconds
+        until it frees up.
+        """
+        now = self.clock()
+        keys = {'user': user_id, 'email': email.strip().lower(), 'global': None}
+        limit = self._first_empty(keys, now)
+        if limit[0] is None:
+            self.limiters['user'].consume(user_id, now)
+            self.allowed += 1
+        return limit
+
+    def take_send(self, email: str) -> tuple[Optional[str], float]:
+        """Take the email and global tokens of a mail about to be queued, or none if either is empty"""
+        now = self.clock()
+        keys = {'email': email.strip().lower(), 'global': None}
+        limit = self._first_empty(keys, now)
+        if limit[0] is None:
+            for name, key in keys.items():
+                self.limiters[name].consume(key, now)
+        return limit
+
+    def _first_empty(self, keys: dict, now: float) -> tuple[Optional[str], float]:
+        for name, key in keys.items():
+            wait = self.limiters[name].retry_after(key, now)
+            if wait > 0:
+                self.rejections[name] += 1
+                return name, wait
+        return None, 0.0
+
+    def stats(self) -> dict:
+        return {
+            'allowed': self.allowed,
+            'rejected': dict(self.rejections),
+            'tracked_users': len(self.limiters['user']),
+            'tracked_emails': len(self.limiters['email']),
+        }
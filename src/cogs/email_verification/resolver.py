@@ -0,0 +1,259 @@
+import logging
+import time
+from collections import OrderedDict
+from typing import Optional
+import discord
+from .circuit_breaker import CircuitBreaker
+from .config import Config
+from .guild_config import GuildSettings, load_guild_settings
+from .validation import EmailValidator, default_validator
+
+logger = logging.getLogger('email_verification')
+
+class GuildResolver:
+    """Caches a verification guild, its Verified role and its log channel.
+
+    The role and the channel are resolved by name once and afterwards looked
+    up by ID; role and channel events keep the cached IDs current. Members come from the gateway cache
+    and only fall back to a REST fetch when they are not cached. Without the
+    members intent the gateway cache stays empty, so fetched members are kept
+    in a small LRU cache of their own that expires entries after
+    MEMBER_CACHE_TTL seconds, as no member update events arrive to refresh them.
+
+    When the guild's shard runs in another bot process the guild is fetched
+    over REST once; it carries the roles but no members or channels, so the
+    log channel is fetched separately and kept until the guild shows up.
+    """
+
+    def __init__(self, bot, guild_id: Optional[str] = Config.GUILD_ID, role_name: str = Config.VERIFIED_ROLE_NAME,
+                 log_channel_name: str = Config.LOG_CHANNEL_NAME, validator: EmailValidator = default_validator):
+        self.bot = bot
+        self.guild_id = int(guild_id) if guild_id else None
+        self.role_name = role_name
+        self.log_channel_name = log_channel_name
+        self.validator = validator
+        self._guild: Optional[discord.Guild] = None
+        self._fetched = False
+        self._role_id: Optional[int] = None
+        self._log_channel_id: Optional[int] = None
+        self._fetched_log_channel = None
+        self.log_breaker = CircuitBreaker(f"log_channel:{self.guild_id}" if self.guild_id else "log_channel",
+                                          slow_call=Config.LOG_SLOW_CALL)
+        self._members: OrderedDict[int, tuple[discord.Member, float]] = OrderedDict()
+        self.member_cache_size = Config.MEMBER_CACHE_SIZE
+        self.member_cache_ttl = Config.MEMBER_CACHE_TTL
+        self.member_cache_hits = 0
+        self.member_fetches = 0
+
+    def guild(self) -> Optional[discord.Guild]:
+        if self._guild is None and self.guild_id is not None:
+            self._guild = self.bot.get_guild(self.guild_id)
+            if self._guild is None:
+                logger.warning(f"Guild {self.guild_id} is not available")
+        return self._guild
+
+    async def resolve_guild(self) -> Optional[discord.Guild]:
+        """Like guild(), falling back to a REST fetch when this process has no shard for it"""
+        guild = self.guild()
+        if guild is None and self.guild_id is not None:
+            try:
+                guild = self._guild = await self.bot.fetch_guild(self.guild_id)
+                self._fetched = True
+            except discord.HTTPException as e:
+                logger.error(f"Failed to fetch guild {self.guild_id}: {e}")
+        return guild
+
+    def verified_role(self) -> Optional[discord.Role]:
+        guild = self.guild()
+        if guild is None:
+            return None
+        if self._role_id is not None:
+            role = guild.get_role(self._role_id)
+            if role is not None:
+                return role
+        role = discord.utils.get(guild.roles, name=self.role_name)
+        self._role_id = role.id if role else None
+        return role
+
+    async def log_channel(self) -> Optional[discord.TextChannel]:
+        if self.guild_id is None:
+            # No guild configured, use the first channel with the name
+            return discord.utils.get(self.bot.get_all_channels(), name=self.log_channel_name)
+        guild = self.guild()
+        if guild is not None and not self._fetched:
+            if self._log_channel_id is not None:
+                channel = guild.get_channel(self._log_channel_id)
+                if channel is not None:
+                    return channel
+            channel = discord.utils.get(guild.channels, name=self.log_channel_name)
+            self._log_channel_id = channel.id if channel else None
+            return channel
+
+        if self._fetched_log_channel is None:
+            guild = await self.resolve_guild()
+            if guild is None:
+                return None
+            try:
+                channels = await guild.fetch_channels()
+            except discord.HTTPException as e:
+                logger.error(f"Failed to fetch channels of guild {self.guild_id}: {e}")
+                return None
+            self._fetched_log_channel = discord.utils.get(channels, name=self.log_channel_name)
+        return self._fetched_log_channel
+
+    def is_member_verified(self, member: discord.Member) -> bool:
+        role = self.verified_role()
+        return role is not None and role in member.roles
+
+    async def get_member(self, user_id: int) -> Optional[discord.Member]:
+        """Get a guild member, from the cache if possible"""
+        guild = await self.resolve_guild()
+        if guild is None:
+            return None
+        member = guild.get_member(user_id) or self._cached_member(user_id)
+        if member is not None:
+            self.member_cache_hits += 1
+            return member
+        self.member_fetches += 1
+        try:
+            member = await guild.fetch_member(user_id)
+        except discord.NotFound:
+            return None
+        self._cache_member(member)
+        return member
+
+    def _cached_member(self, user_id: int) -> Optional[discord.Member]:
+        entry = self._members.get(user_id)
+        if entry is None:
+            return None
+        member, fetched_at = entry
+        if time.monotonic() - fetched_at > self.member_cache_ttl:
+            del self._members[user_id]
+            return None
+        self._members.move_to_end(user_id)
+        return member
+
+    def _cache_member(self, member: discord.Member) -> None:
+        if self.member_cache_size <= 0:
+            return
+        self._members[member.id] = (member, time.monotonic())
+        self._members.move_to_end(member.id)
+        while len(self._members) > self.member_cache_size:
+            self._members.popitem(last=False)
+
+    def forget_member(self, user_id: int) -> None:
+        """Drop a cached member whose roles were just changed"""
+        self._members.pop(user_id, None)
+
+    def is_verification_guild(self, guild: discord.Guild) -> bool:
+        return guild.id == self.guild_id
+
+    def on_guild_available(self, guild: discord.Guild) -> None:
+        if self.is_verification_guild(guild):
+            self._guild = guild
+            self._fetched = False
+            self._role_id = None
+            self._log_channel_id = None
+            self._fetched_log_channel = None
+
+    def on_guild_unavailable(self, guild: discord.Guild) -> None:
+        if self.is_verification_guild(guild):
+            self._guild = None
+            self._members.clear()
+
+    def on_role_change(self, role: discord.Role) -> None:
+        """Track creation or renaming of the Verified role"""
+        if not self.is_verification_guild(role.guild):
+            return
+        if role.name == self.role_name:
+            self._role_id = role.id
+        elif role.id == self._role_id:
+            self._role_id = None
+
+    def on_role_delete(self, role: discord.Role) -> None:
+        if self.is_verification_guild(role.guild) and role.id == self._role_id:
+            self._role_id = None
+
+    def on_channel_change(self, channel: discord.abc.GuildChannel) -> None:
+        """Track creation or renaming of the log channel"""
+        if not self.is_verification_guild(channel.guild):
+            return
+        if channel.name == self.log_channel_name and isinstance(channel, discord.TextChannel):
+            self._log_channel_id = channel.id
+        elif channel.id == self._log_channel_id:
+            self._log_channel_id = None
+
+    def on_channel_delete(self, channel: discord.abc.GuildChannel) -> None:
+        if self.is_verification_guild(channel.guild) and channel.id == self._log_channel_id:
+            self._log_channel_id = None
+
+class GuildDirectory:
+    """The GuildResolver of every guild the bot verifies for.
+
+    Settings are loaded once at startup. Guilds with the same email rules
+    share one compiled EmailValidator. Gateway events are routed to the
+    resolver of the guild they happened in, which keeps its caches current
+    without rescanning. The first configured guild is the default, used for
+    events that belong to no particular guild.
+    """
+
+    def __init__(self, bot, settings: list[GuildSettings]):
+        validators = {(Config.ALLOWED_DOMAIN, Config.STUDENT_PATTERN, Config.PROF_PATTERN): default_validator}
+        self._resolvers: dict[int, GuildResolver] = {}
+        for entry in settings:
+            rules = (entry.allowed_domain, entry.student_pattern, entry.staff_pattern)
+            if rules not in validators:
+                validators[rules] = EmailValidator(*rules)
+            self._resolvers[entry.guild_id] = GuildResolver(
+                bot, entry.guild_id, entry.verified_role, entry.log_channel, validators[rules]
+            )
+        # Without any configured guild, keep the old behaviour of an unset GUILD_ID
+        self.default = next(iter(self._resolvers.values()), None) or GuildResolver(bot, None)
+
+    @classmethod
+    def from_config(cls, bot) -> "GuildDirectory":
+        return cls(bot, load_guild_settings())
+
+    def __len__(self) -> int:
+        return len(self._resolvers)
+
+    def __iter__(self):
+        return iter(self._resolvers.values())
+
+    def get(self, guild_id: Optional[int]) -> Optional[GuildResolver]:
+        """Resolver of a configured guild, None for any other guild"""
+        return self._resolvers.get(guild_id)
+
+    def resolve(self, guild_id: Optional[int]) -> GuildResolver:
+        """Like get(), falling back to the default guild"""
+        return self._resolvers.get(guild_id, self.default)
+
+    def on_guild_available(self, guild: discord.Guild) -> None:
+        resolver = self.get(guild.id)
+        if resolver is not None:
+            resolver.on_guild_available(guild)
+
+    def on_guild_unavailable(self, guild: discord.Guild) -> None:
+        resolver = self.get(guild.id)
+        if resolver is not None:
+            resolver.on_guild_unavailable(guild)
+
+    def on_role_change(self, role: discord.Role) -> None:
+        resolver = self.get(role.guild.id)
+        if resolver is not None:
+            resolver.on_role_change(role)
+
+    def on_role_delete(self, role: discord.Role) -> None:
+        resolver = self.get(role.guild.id)
+        if resolver is not None:
+            resolver.on_role_delete(role)
+
+    def on_channel_change(self, channel: discord.abc.GuildChannel) -> None:
+        resolver = self.get(channel.guild.id)
+        if resolver is not None:
+            resolver.on_channel_change(channel)
+
+    def on_channel_delete(self, channel: discord.abc.GuildChannel) -> None:
+        resolver = self.get(channel.guild.id)
+        if resolver is not None:
+            resolver.on_channel_delete(channel)
@@ -0,0 +1,286 @@
+import os
+import sqlite3
+import time
+from contextlib import contextmanager
+from typing import Hashable, Optional
+from .config import Config
+from .pending_store import EmailPendingError, PendingVerification
+from .rate_limit import RateLimiter, TokenBucket, VerifyRateLimits
+
+SCHEMA = (
+    """CREATE TABLE IF NOT EXISTS pending_verifications (
+        user_id INTEGER PRIMARY KEY,
+        email TEXT NOT NULL,
+        code TEXT NOT NULL,
+        attempts INTEGER NOT NULL DEFAULT 0,
+        created_at REAL NOT NULL,
+        guild_id INTEGER
+    )""",
+    "CREATE INDEX IF NOT EXISTS idx_pending_created_at ON pending_verifications (created_at)",
+    "CREATE INDEX IF NOT EXISTS idx_pending_email ON pending_verifications (lower(email))",
+    """CREATE TABLE IF NOT EXISTS rate_buckets (
+        limiter TEXT NOT NULL,
+        bucket_key TEXT NOT NULL,
+        tokens REAL NOT NULL,
+        updated REAL NOT NULL,
+        PRIMARY KEY (limiter, bucket_key)
+    )""",
+)
+
+# Columns added after a table was first created: (table, column, definition)
+COLUMNS = (
+    ("pending_verifications", "guild_id", "INTEGER"),
+)
+
+class StateBusyError(Exception):
+    """Another process held the shared state for longer than STATE_BUSY_TIMEOUT"""
+    pass
+
+class SharedState:
+    """SQLite database in WAL mode shared by all bot processes on one host.
+
+    Queries run directly on the event loop, which lets the shared stores keep
+    the synchronous interface of the in-memory ones. They touch single rows
+    and are usually fast, but another process's write lock or a checkpoint on
+    slow storage can hold them up. Writes therefore wait at most
+    STATE_BUSY_TIMEOUT for a lock and raise StateBusyError after that, so
+    callers can ask the user to retry instead of stalling the gateway.
+    Timestamps are wall-clock seconds, as monotonic clocks restart with the
+    host while the file does not.
+    """
+
+    def __init__(self, path: str = Config.STATE_PATH, busy_timeout: float = Config.STATE_BUSY_TIMEOUT):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self.connection = sqlite3.connect(path, timeout=busy_timeout, isolation_level=None)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        for statement in SCHEMA:
+            self.connection.execute(statement)
+        for table, column, definition in COLUMNS:
+            existing = {row[1] for row in self.connection.execute(f"PRAGMA table_info({table})")}
+            if column not in existing:
+                self.connection.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+
+    @classmethod
+    def from_config(cls) -> Optional["SharedState"]:
+        """Open the configured state backend, None keeps state in process memory"""
+        if Config.STATE_BACKEND == "memory":
+            return None
+        if Config.STATE_BACKEND == "sqlite":
+            return cls(Config.STATE_PATH)
+        raise ValueError(f"Unknown state backend: {Config.STATE_BACKEND}")
+
+    def execute(self, sql: str, params: tuple = ()) -> sqlite3.Cursor:
+        return self.connection.execute(sql, params)
+
+    @contextmanager
+    def transaction(self):
+        """Run a read-modify-write without other processes writing in between.
+
+        Raises StateBusyError if another process keeps the lock for too long.
+        """
+        try:
+            self.connection.execute("BEGIN IMMEDIATE")
+        except sqlite3.OperationalError as e:
+            if self._is_busy(e):
+                raise StateBusyError(str(e)) from e
+            raise
+        try:
+            yield
+        except BaseException:
+            self.connection.execute("ROLLBACK")
+            raise
+        try:
+            self.connection.execute("COMMIT")
+        except sqlite3.OperationalError as e:
+            self.connection.execute("ROLLBACK")
+            if self._is_busy(e):
+                raise StateBusyError(str(e)) from e
+            raise
+
+    @staticmethod
+    def _is_busy(error: sqlite3.OperationalError) -> bool:
+        message = str(error)
+        return "locked" in message or "busy" in message
+
+    def close(self) -> None:
+        self.connection.close()
+
+class SharedPendingStore:
+    """PendingVerificationStore kept in SharedState, so >confirm works on any process.
+
+    Rows are not evicted for capacity. Rows past their TTL are purged when a
+    new verification is stored, which also covers codes whose expiry was
+    scheduled by a process that has since exited.
+    """
+
+    def __init__(self, state: SharedState, ttl: float = Config.VERIFICATION_TIMEOUT):
+        self.state = state
+        self.ttl = ttl
+        self.expirations = 0
+
+    def __len__(self) -> int:
+        return self.state.execute("SELECT COUNT(*) FROM pending_verifications").fetchone()[0]
+
+    def __contains__(self, user_id: int) -> bool:
+        return self.state.execute(
+            "SELECT 1 FROM pending_verifications WHERE user_id = ?", (user_id,)
+        ).fetchone() is not None
+
+    def is_expired(self, verification: PendingVerification) -> bool:
+        return verification.age() > self.ttl
+
+    def _select(self, user_id: int) -> Optional[PendingVerification]:
+        row = self.state.execute(
+            "SELECT email, code, attempts, created_at, guild_id FROM pending_verifications WHERE user_id = ?",
+            (user_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        email, code, attempts, created_at, guild_id = row
+        # Translate the stored wall-clock time onto this process's monotonic clock
+        return PendingVerification(email, code, attempts, time.monotonic() - (time.time() - created_at), guild_id)
+
+    def get(self, user_id: int) -> Optional[PendingVerification]:
+        return self._select(user_id)
+
+    def owner_of(self, email: str) -> Optional[int]:
+        """User with a live code for the address"""
+        row = self.state.execute(
+            "SELECT user_id FROM pending_verifications WHERE lower(email) = ? AND created_at >= ?",
+            (email.lower(), time.time() - self.ttl)
+        ).fetchone()
+        return row[0] if row else None
+
+    def put(self, user_id: int, email: str, code: str, guild_id: Optional[int] = None) -> PendingVerification:
+        """Store a new pending verification, replacing any previous one for the user.
+
+        Raises EmailPendingError if another user has a live code for the
+        address; the check and the insert happen in one transaction, so two
+        processes cannot both claim an address.
+        """
+        now = time.time()
+        with self.state.transaction():
+            purged = self.state.execute(
+                "DELETE FROM pending_verifications WHERE created_at < ?", (now - self.ttl,)
+            ).rowcount
+            owner_id = self.owner_of(email)
+            if owner_id is not None and owner_id != user_id:
+                raise EmailPendingError(owner_id)
+            self.state.execute(
+                "INSERT OR REPLACE INTO pending_verifications (user_id, email, code, attempts, created_at, guild_id) "
+                "VALUES (?, ?, ?, 0, ?, ?)",
+                (user_id, email, code, now, guild_id)
+            )
+        self.expirations += purged
+        return PendingVerification(email, code, guild_id=guild_id)
+
+    def add_attempt(self, user_id: int) -> int:
+        """Count a failed confirmation, returns the attempts so far"""
+        with self.state.transaction():
+            self.state.execute(
+                "UPDATE pending_verifications SET attempts = attempts + 1 WHERE user_id = ?", (user_id,)
+            )
+            row = self.state.execute(
+                "SELECT attempts FROM pending_verifications WHERE user_id = ?", (user_id,)
+            ).fetchone()
+        return row[0] if row else 0
+
+    def delete(self, user_id: int) -> Optional[PendingVerification]:
+        with self.state.transaction():
+            verification = self._select(user_id)
+            if verification is not None:
+                self.state.execute("DELETE FROM pending_verifications WHERE user_id = ?", (user_id,))
+        return verification
+
+    def expire(self, user_id: int) -> Optional[PendingVerification]:
+        """Remove an entry that ran out of time.
+
+        Another process may have replaced the entry after this process
+        scheduled its expiry, so only an entry that really is expired goes.
+        """
+        with self.state.transaction():
+            verification = self._select(user_id)
+            if verification is None or not self.is_expired(verification):
+                return None
+            self.state.execute("DELETE FROM pending_verifications WHERE user_id = ?", (user_id,))
+        self.expirations += 1
+        return verification
+
+    def stats(self) -> dict:
+        return {
+            'entries': len(self),
+            'capacity': None,
+            'evictions': 0,
+            'expirations': self.expirations,
+            'path': self.state.path,
+        }
+
+class SharedRateLimiter(RateLimiter):
+    """RateLimiter whose buckets live in SharedState.
+
+    Must be used inside a SharedState transaction, as SharedVerifyRateLimits does.
+    """
+
+    def __init__(self, state: SharedState, name: str, capacity: int, period: float):
+        super().__init__(capacity, period)
+        self.state = state
+        self.name = name
+        self.period = period
+
+    def _bucket(self, key: Hashable, now: float) -> TokenBucket:
+        row = self.state.execute(
+            "SELECT tokens, updated FROM rate_buckets WHERE limiter = ? AND bucket_key = ?", (self.name, str(key))
+        ).fetchone()
+        if row is None:
+            return TokenBucket(self.capacity, now)
+        tokens, updated = row
+        return TokenBucket(min(self.capacity, tokens + max(0.0, now - updated) * self.rate), now)
+
+    def consume(self, key: Hashable, now: Optional[float] = None) -> None:
+        now = time.time() if now is None else now
+        bucket = self._bucket(key, now)
+        self.state.execute(
+            "INSERT OR REPLACE INTO rate_buckets (limiter, bucket_key, tokens, updated) VALUES (?, ?, ?, ?)",
+            (self.name, str(key), bucket.tokens - 1, now)
+        )
+
+    def prune(self, now: float) -> None:
+        """Drop buckets that have refilled completely, they start out full anyway"""
+        self.state.execute(
+            "DELETE FROM rate_buckets WHERE limiter = ? AND updated < ?", (self.name, now - self.period)
+        )
+
+    def __len__(self) -> int:
+        return self.state.execute(
+            "SELECT COUNT(*) FROM rate_buckets WHERE limiter = ?", (self.name,)
+        ).fetchone()[0]
+
+class SharedVerifyRateLimits(VerifyRateLimits):
+    """VerifyRateLimits with buckets shared by all processes"""
+    clock = staticmethod(time.time)
+    PRUNE_EVERY = 1000
+
+    def __init__(self, state: SharedState):
+        self.state = state
+        self._checks = 0
+        super().__init__()
+
+    def _limiter(self, name: str, capacity: int, period: float) -> RateLimiter:
+        return SharedRateLimiter(self.state, name, capacity, period)
+
+    def check(self, user_id: int, email: str) -> tuple[Optional[str], float]:
+        with self.state.transaction():
+            self._checks += 1
+            if self._checks % self.PRUNE_EVERY == 0:
+                now = self.clock()
+                for limiter in self.limiters.values():
+                    limiter.prune(now)
+            return super().check(user_id, email)
+
+    def take_send(self, email: str) -> tuple[Optional[str], float]:
+        with self.state.transaction():
+            return super().take_send(email)
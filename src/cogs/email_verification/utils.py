@@ -1,37 +1,81 @@
 
 import discord
 from datetime import datetime 
-import re 
 import logging
-from .config import Config
+import time
+from typing import Optional
+from .resolver import GuildDirectory, GuildResolver
+from .validation import EmailClass, EmailValidator, default_validator
+from .metrics import LOG_EVENTS, LOG_FLUSH_SECONDS
 
 logger = logging.getLogger('email_verification')
 
 class VerificationUtils:
-    _log_channel = None
+    _guilds = None
+    _log_sink = None
+    _audit_log = None
 
     @staticmethod
-    async def get_log_channel(bot) -> discord.TextChannel:
-        """Get or retrieve the logging channel"""
-        if VerificationUtils._log_channel is None:
-            for guild in bot.guilds:
-                channel = discord.utils.get(guild.channels, name=Config.LOG_CHANNEL_NAME)
-                if channel:
-                    VerificationUtils._log_channel = channel
-                    break
-        return VerificationUtils._log_channel
+    def set_log_sink(sink) -> None:
+        """Route log_to_channel through a buffering LogSink, or None to send directly"""
+        VerificationUtils._log_sink = sink
 
     @staticmethod
-    async def log_to_channel(bot, embed: discord.Embed) -> None:
-        """Send a log message to the designated channel"""
-        channel = await VerificationUtils.get_log_channel(bot)
+    def set_audit_log(audit_log) -> None:
+        """Also record every logged event in an AuditLog, or None to stop"""
+        VerificationUtils._audit_log = audit_log
+
+    @staticmethod
+    def set_guild_directory(guilds: Optional[GuildDirectory]) -> None:
+        """Look up log channels in the given GuildDirectory"""
+        VerificationUtils._guilds = guilds
+
+    @staticmethod
+    def resolver_for(bot, guild_id: Optional[int] = None) -> GuildResolver:
+        """GuildResolver holding a guild's log channel and breaker, by default of the first configured guild"""
+        if VerificationUtils._guilds is None:
+            VerificationUtils._guilds = GuildDirectory.from_config(bot)
+        return VerificationUtils._guilds.resolve(guild_id)
+
+    @staticmethod
+    async def get_log_channel(bot, guild_id: Optional[int] = None) -> Optional[discord.TextChannel]:
+        """Get the logging channel of a guild, by default of the first configured one"""
+        return await VerificationUtils.resolver_for(bot, guild_id).log_channel()
+
+    @staticmethod
+    async def log_to_channel(bot, embed: discord.Embed, guild_id: Optional[int] = None, audit: bool = True) -> None:
+        """Send a log message to the log channel of a guild, by default of the first configured one.
+
+        Pass audit=False for summaries whose events were already recorded one by one.
+        """
+        resolver = VerificationUtils.resolver_for(bot, guild_id)
+        guild_id = resolver.guild_id
+        if audit and VerificationUtils._audit_log is not None:
+            VerificationUtils._audit_log.record(embed, guild_id)
+        sink = VerificationUtils._log_sink
+        if sink is not None and sink.running:
+            sink.put(embed, guild_id)
+            return
+        channel = await resolver.log_channel()
         if channel is None:
-            logger.error(f"Could not find channel named {Config.LOG_CHANNEL_NAME}")
+            logger.error(f"Could not find log channel #{resolver.log_channel_name} "
+                         f"of guild {resolver.guild_id or 'default'}")
             return
+        breaker = resolver.log_breaker
+        if not breaker.allow():
+            LOG_EVENTS.labels('breaker_open').inc()
+            return
+        started = time.perf_counter()
         try:
             await channel.send(embed=embed)
         except Exception as e:
+            breaker.record(False)
             logger.error(f"Failed to send log message: {e}")
+            return
+        elapsed = time.perf_counter() - started
+        breaker.record(True, elapsed)
+        LOG_FLUSH_SECONDS.observe(elapsed)
+        LOG_EVENTS.labels('sent_directly').inc()
 
     @staticmethod
     def create_log_embed(title: str, description: str, color: discord.Color, fields: list) -> discord.Embed:
@@ -48,15 +92,6 @@ class VerificationUtils:
         return embed
 
     @staticmethod
-    def is_valid_student_email(email: str) -> tuple[bool, str]:
-        if not email.endswith(Config.ALLOWED_DOMAIN):
-            return False, "Email must be a THU email address"
-
-        if re.match(Config.STUDENT_PATTERN, email):
-            return True, "Valid email"
-
-        if re.match(Config.PROF_PATTERN, email):
-            return False, "Valid staff email"
-
-        return False, "E-Mail-Format ungültig"
-
+    def is_valid_student_email(email: str, validator: EmailValidator = default_validator) -> tuple[bool, str]:
+        email_class, message = validator.classify(email)
+        return email_class is EmailClass.STUDENT, message
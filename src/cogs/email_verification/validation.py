@@ -0,0 +1,89 @@
+import csv
+import re
+from collections import Counter
+from enum import Enum
+from typing import IO, Iterable, Iterator, Optional, Union
+from .config import Config
+
+class EmailClass(Enum):
+    STUDENT = "student"
+    STAFF = "staff"
+    INVALID = "invalid"
+
+class EmailValidator:
+    """Classifies addresses as student, staff or invalid with rules compiled once"""
+
+    def __init__(self, domain: str = Config.ALLOWED_DOMAIN, student_pattern: str = Config.STUDENT_PATTERN,
+                 staff_pattern: str = Config.PROF_PATTERN):
+        self.domain = domain
+        self._student = re.compile(student_pattern)
+        self._staff = re.compile(staff_pattern)
+
+    def classify(self, email: str) -> tuple[EmailClass, str]:
+        """Classify one address, returns the class and a reason"""
+        if not email.endswith(self.domain):
+            return EmailClass.INVALID, "Email must be a THU email address"
+        if self._student.match(email):
+            return EmailClass.STUDENT, "Valid email"
+        if self._staff.match(email):
+            return EmailClass.STAFF, "Valid staff email"
+        return EmailClass.INVALID, "E-Mail-Format ungültig"
+
+    def classify_many(self, emails: Iterable[str]) -> Iterator[tuple[str, EmailClass]]:
+        """Lazily classify addresses, blank entries are skipped"""
+        for email in emails:
+            email = email.strip()
+            if email:
+                yield email, self.classify(email)[0]
+
+    def classify_file(self, file: Union[str, IO[str]],
+                      column: Union[int, str, None] = None) -> Iterator[tuple[str, EmailClass]]:
+        """Stream a roster file, either one address per line or CSV.
+
+        `column` is the CSV column index or header name holding the address.
+        A first row without an @ is treated as a header. Without a column the
+        first one with an @ in the first data row is used, or else the first
+        header that mentions mail.
+        """
+        if isinstance(file, str):
+            with open(file, newline='', encoding='utf-8') as handle:
+                yield from self.classify_file(handle, column)
+            return
+
+        rows = csv.reader(file)
+        first = next(rows, None)
+        if first is None:
+            return
+        if column is None:
+            index = _email_column(first)
+            if index is not None:
+                rows = _prepend(first, rows)
+            else:
+                second = next(rows, None)
+                if second is None:
+                    return
+                index = _email_column(second)
+                if index is None:
+                    index = next((i for i, name in enumerate(first) if "mail" in name.lower()), 0)
+                rows = _prepend(second, rows)
+        elif isinstance(column, str):
+            index = first.index(column)
+        else:
+            index = column
+            if index < len(first) and "@" in first[index]:
+                rows = _prepend(first, rows)
+        yield from self.classify_many(row[index] for row in rows if index < len(row))
+
+    @staticmethod
+    def count(results: Iterable[tuple[str, EmailClass]]) -> Counter:
+        """Per-class counts of classify_many/classify_file results"""
+        return Counter(email_class for _, email_class in results)
+
+def _email_column(row: list[str]) -> Optional[int]:
+    return next((i for i, cell in enumerate(row) if "@" in cell), None)
+
+def _prepend(first, rows):
+    yield first
+    yield from rows
+
+default_validator = EmailValidator()
@@ -0,0 +1,296 @@
+import asyncio
+import hashlib
+import logging
+import os
+import queue
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Optional
+from .config import Config
+from .verified_index import VerifiedUserIndex
+
+try:
+    import mariadb
+except ImportError:
+    mariadb = None
+
+logger = logging.getLogger('email_verification')
+
+SCHEMA = (
+    """CREATE TABLE IF NOT EXISTS verified_users (
+        user_id BIGINT NOT NULL PRIMARY KEY,
+        email_hash CHAR(64) NOT NULL,
+        updated_at BIGINT NOT NULL DEFAULT 0
+    )""",
+    "CREATE INDEX IF NOT EXISTS idx_verified_users_email_hash ON verified_users (email_hash)",
+    "CREATE INDEX IF NOT EXISTS idx_verified_users_updated_at ON verified_users (updated_at)",
+)
+
+# Rows written within this many milliseconds of the last seen change are
+# fetched again, so concurrent writers committing out of order are not missed
+SYNC_OVERLAP_MS = 5000
+
+def _now_ms() -> int:
+    return int(time.time() * 1000)
+
+class _PooledConnection:
+    """A database connection together with its cached statements"""
+
+    def __init__(self, conn, cursor_factory: Callable):
+        self.conn = conn
+        self._cursor_factory = cursor_factory
+        self._statements: dict[str, Any] = {}
+
+    def execute(self, sql: str, params: tuple = ()):
+        """Execute sql on a cursor reserved for it, so it is only prepared once per connection"""
+        cursor = self._statements.get(sql)
+        if cursor is None:
+            cursor = self._statements[sql] = self._cursor_factory(self.conn)
+        cursor.execute(sql, params)
+        return cursor
+
+    def close(self) -> None:
+        for cursor in self._statements.values():
+            try:
+                cursor.close()
+            except Exception:
+                pass
+        self.conn.close()
+
+class DatabaseBackend:
+    """Runs blocking DB-API calls on a thread pool, each on its own pooled connection"""
+
+    name = "database"
+
+    def __init__(self, pool_size: int = Config.DB_POOL_SIZE):
+        self.pool_size = max(1, pool_size)
+        self._connections: queue.LifoQueue[_PooledConnection] = queue.LifoQueue()
+        self._executor = ThreadPoolExecutor(max_workers=self.pool_size, thread_name_prefix=f"{self.name}-db")
+
+    def _connect(self) -> _PooledConnection:
+        raise NotImplementedError
+
+    def _call(self, fn: Callable, *args):
+        try:
+            conn = self._connections.get_nowait()
+        except queue.Empty:
+            conn = self._connect()
+        try:
+            result = fn(conn, *args)
+            conn.conn.commit()
+        except Exception:
+            try:
+                conn.conn.rollback()
+            except Exception:
+                # Connection is gone, do not hand it out again
+                conn.close()
+                raise
+            self._connections.put(conn)
+            raise
+        self._connections.put(conn)
+        return result
+
+    async def run(self, fn: Callable, *args):
+        """Run fn(connection, *args) in a transaction without blocking the event loop"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self._call, fn, *args)
+
+    async def close(self) -> None:
+        self._executor.shutdown(wait=True)
+        while True:
+            try:
+                self._connections.get_nowait().close()
+            except queue.Empty:
+                break
+
+class SQLiteBackend(DatabaseBackend):
+    name = "sqlite"
+
+    def __init__(self, path: str = Config.SQLITE_PATH, pool_size: int = Config.DB_POOL_SIZE):
+        self.path = path
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        super().__init__(pool_size)
+
+    def _connect(self) -> _PooledConnection:
+        conn = sqlite3.connect(self.path, check_same_thread=False, timeout=10)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return _PooledConnection(conn, lambda c: c.cursor())
+
+class MariaDBBackend(DatabaseBackend):
+    name = "mariadb"
+
+    def __init__(self, pool_size: int = Config.DB_POOL_SIZE):
+        if mariadb is None:
+            raise RuntimeError("STORAGE_BACKEND is mariadb but the mariadb package is not installed")
+        super().__init__(pool_size)
+
+    def _connect(self) -> _PooledConnection:
+        try:
+            conn = mariadb.connect(
+                user=Config.DB_USER,
+                password=Config.DB_PASSWORD,
+                host=Config.DB_HOST,
+                port=Config.DB_PORT,
+                database=Config.DB_NAME
+            )
+        except mariadb.Error as e:
+            logger.error(f"Error connecting to MariaDB: {e}")
+            raise
+        logger.info("Connected to MariaDB database.")
+        return _PooledConnection(conn, lambda c: c.cursor(prepared=True))
+
+class VerificationStorage:
+    """Verified users table on a pooled, non-blocking backend.
+
+    Lookups are served from an in-memory VerifiedUserIndex once it is loaded.
+    Writes update the index in place and a background task pulls in rows
+    changed by other processes.
+    """
+
+    def __init__(self, backend: DatabaseBackend, index: Optional[VerifiedUserIndex] = None):
+        self.backend = backend
+        self.index = index if index is not None else VerifiedUserIndex()
+        self._sync_task: Optional[asyncio.Task] = None
+
+    @classmethod
+    def from_config(cls) -> Optional["VerificationStorage"]:
+        """Build the storage selected by STORAGE_BACKEND, or None if storage is disabled"""
+        if Config.STORAGE_BACKEND == "none":
+            return None
+        if Config.STORAGE_BACKEND == "sqlite":
+            return cls(SQLiteBackend())
+        if Config.STORAGE_BACKEND == "mariadb":
+            return cls(MariaDBBackend())
+        raise ValueError(f"Unknown storage backend: {Config.STORAGE_BACKEND}")
+
+    @staticmethod
+    def hash_email(email: str) -> str:
+        return hashlib.sha256(email.strip().lower().encode()).hexdigest()
+
+    async def setup(self) -> None:
+        """Create the table and its email_hash index if they do not exist yet"""
+        def create(conn):
+            conn.execute(SCHEMA[0])
+            columns = [column[0] for column in conn.execute("SELECT * FROM verified_users WHERE 1=0").description]
+            if "updated_at" not in columns:
+                conn.execute("ALTER TABLE verified_users ADD COLUMN updated_at BIGINT NOT NULL DEFAULT 0")
+            for statement in SCHEMA[1:]:
+                conn.execute(statement)
+        await self.backend.run(create)
+        await self.full_sync()
+        self._sync_task = asyncio.create_task(self._sync_loop(), name="verified-index-sync")
+        logger.info(f"Verification storage ready ({self.backend.name}, {len(self.index)} verified users)")
+
+    async def close(self) -> None:
+        if self._sync_task is not None:
+            self._sync_task.cancel()
+            await asyncio.gather(self._sync_task, return_exceptions=True)
+            self._sync_task = None
+        await self.backend.close()
+
+    async def full_sync(self) -> None:
+        """Reload the whole index from the database"""
+        def load(conn):
+            return conn.execute("SELECT user_id, email_hash, updated_at FROM verified_users").fetchall()
+        self.index.load(await self.backend.run(load))
+
+    async def incremental_sync(self) -> int:
+        """Pull rows changed since the last sync into the index, returns the number of rows"""
+        since = max(0, self.index.watermark - SYNC_OVERLAP_MS)
+        def load(conn):
+            return conn.execute(
+                "SELECT user_id, email_hash, updated_at FROM verified_users WHERE updated_at >= ?",
+                (since,)
+            ).fetchall()
+        rows = await self.backend.run(load)
+        self.index.apply(rows)
+        return len(rows)
+
+    async def _sync_loop(self) -> None:
+        # Deletions are not visible to the incremental query, so every few
+        # rounds the index is rebuilt from scratch
+        rounds = 0
+        while True:
+            await asyncio.sleep(Config.VERIFIED_SYNC_INTERVAL)
+            rounds += 1
+            try:
+                if rounds % Config.VERIFIED_FULL_SYNC_EVERY == 0:
+                    await self.full_sync()
+                else:
+                    await self.incremental_sync()
+            except Exception as e:
+                logger.error(f"Error syncing verified user index: {e}")
+
+    async def load_verified_users(self) -> dict:
+        """Load verified users from the database, bypassing the index"""
+        def load(conn):
+            return conn.execute("SELECT user_id, email_hash FROM verified_users").fetchall()
+        verified_users = {}
+        try:
+            for user_id, email_hash in await self.backend.run(load):
+                verified_users[str(user_id)] = email_hash
+        except Exception as e:
+            logger.error(f"Error loading verified users: {e}")
+        return verified_users
+
+    async def save_verified_user(self, user_id: int, email_hash: str) -> None:
+        """Save a verified user to the database"""
+        def save(conn):
+            conn.execute(
+                "REPLACE INTO verified_users (user_id, email_hash, updated_at) VALUES (?, ?, ?)",
+                (user_id, email_hash, _now_ms())
+            )
+        try:
+            await self.backend.run(save)
+            self.index.put(user_id, email_hash)
+        except Exception as e:
+            logger.error(f"Error saving verified user: {e}")
+
+    async def remove_verified_user(self, user_id: int) -> None:
+        """Remove a user from the database"""
+        def remove(conn):
+            conn.execute("DELETE FROM verified_users WHERE user_id=?", (user_id,))
+        try:
+            await self.backend.run(remove)
+            self.index.remove(user_id)
+        except Exception as e:
+            logger.error(f"Error removing verified user: {e}")
+
+    async def is_verified(self, user_id: int) -> bool:
+        """Check if a user is verified in the database"""
+        if self.index.ready:
+            return self.index.is_verified(user_id)
+        def check(conn):
+            return conn.execute(
+                "SELECT EXISTS(SELECT 1 FROM verified_users WHERE user_id=?)",
+                (user_id,)
+            ).fetchone()[0] == 1
+        try:
+            return await self.backend.run(check)
+        except Exception as e:
+            logger.error(f"Error checking verification status: {e}")
+            return False
+
+    async def is_email_used(self, email: str) -> tuple[bool, str]:
+        """Check if an email is already used in the database"""
+        email_hash = self.hash_email(email)
+        if self.index.ready:
+            if not self.index.may_contain_email(email_hash):
+                return False, ""
+            if self.index.exact:
+                return True, str(self.index.email_owner(email_hash))
+        def check(conn):
+            return conn.execute(
+                "SELECT user_id FROM verified_users WHERE email_hash=?",
+                (email_hash,)
+            ).fetchone()
+        try:
+            result = await self.backend.run(check)
+            if result:
+                return True, str(result[0])
+        except Exception as e:
+            logger.error(f"Error checking if email is used: {e}")
+        return False, ""
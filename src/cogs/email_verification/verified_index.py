@@ -0,0 +1,102 @@
+import math
+from typing import Iterable, Optional
+from .config import Config
+
+class BloomFilter:
+    """Bloom filter over sha256 hex digests.
+
+    The digests are already uniformly distributed, so bit positions are derived
+    from them by double hashing instead of hashing again.
+    """
+
+    def __init__(self, capacity: int, error_rate: float = 0.001):
+        capacity = max(1, capacity)
+        self.size = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hash_count = max(1, round(self.size / capacity * math.log(2)))
+        self._bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, digest: str):
+        h1 = int(digest[:16], 16)
+        h2 = int(digest[16:32], 16) | 1
+        for i in range(self.hash_count):
+            yield (h1 + i * h2) % self.size
+
+    def add(self, digest: str) -> None:
+        for pos in self._positions(digest):
+            self._bits[pos >> 3] |= 1 << (pos & 7)
+
+    def __contains__(self, digest: str) -> bool:
+        return all(self._bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(digest))
+
+class VerifiedUserIndex:
+    """In-memory view of the verified_users table.
+
+    In "full" mode both user_id -> email_hash and email_hash -> user_id are
+    kept, so every lookup is answered from memory. In "bloom" mode only the
+    verified user ids and a Bloom filter of email hashes are kept; an email
+    the filter has never seen is answered from memory, a possible match still
+    has to be confirmed by the database.
+    """
+
+    def __init__(self, mode: str = Config.VERIFIED_INDEX_MODE, bloom_capacity: int = Config.VERIFIED_BLOOM_CAPACITY):
+        if mode not in ("full", "bloom"):
+            raise ValueError(f"Unknown verified index mode: {mode}")
+        self.mode = mode
+        self.bloom_capacity = bloom_capacity
+        self.ready = False
+        self.watermark = 0
+        self._by_user: dict[int, Optional[str]] = {}
+        self._by_email: dict[str, int] = {}
+        self._bloom: Optional[BloomFilter] = None
+
+    def __len__(self) -> int:
+        return len(self._by_user)
+
+    @property
+    def exact(self) -> bool:
+        """True if email lookups never need the database"""
+        return self.mode == "full"
+
+    def load(self, rows: Iterable[tuple[int, str, int]]) -> None:
+        """Replace the index with a full snapshot of (user_id, email_hash, updated_at) rows"""
+        self._by_user = {}
+        self._by_email = {}
+        self._bloom = BloomFilter(self.bloom_capacity) if self.mode == "bloom" else None
+        self.watermark = 0
+        self.apply(rows)
+        self.ready = True
+
+    def apply(self, rows: Iterable[tuple[int, str, int]]) -> None:
+        """Upsert changed rows"""
+        for user_id, email_hash, updated_at in rows:
+            self.put(int(user_id), email_hash)
+            self.watermark = max(self.watermark, updated_at)
+
+    def put(self, user_id: int, email_hash: str) -> None:
+        if self.mode == "full":
+            previous = self._by_user.get(user_id)
+            if previous is not None and self._by_email.get(previous) == user_id:
+                del self._by_email[previous]
+            self._by_user[user_id] = email_hash
+            self._by_email[email_hash] = user_id
+        else:
+            self._by_user[user_id] = None
+            self._bloom.add(email_hash)
+
+    def remove(self, user_id: int) -> None:
+        email_hash = self._by_user.pop(user_id, None)
+        if email_hash is not None and self._by_email.get(email_hash) == user_id:
+            del self._by_email[email_hash]
+
+    def is_verified(self, user_id: int) -> bool:
+        return user_id in self._by_user
+
+    def may_contain_email(self, email_hash: str) -> bool:
+        """False means the email is definitely not used"""
+        if self.mode == "full":
+            return email_hash in self._by_email
+        return email_hash in self._bloom
+
+    def email_owner(self, email_hash: str) -> Optional[int]:
+        """User owning email_hash, only meaningful in full mode"""
+        return self._by_email.get(email_hash)
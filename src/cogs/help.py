@@ -1,9 +1,42 @@
 from discord.ext import commands
 import discord
+from typing import Optional
 from cogs.email_verification.config import Config
 
 class CustomHelpCommand(commands.HelpCommand):
+    # discord.py copies the help command for every invocation, so rendered
+    # embeds are kept on the class. Entries depend on the caller's permission
+    # tier and are dropped whenever the loaded cogs or commands change.
+    _embeds: dict[tuple, discord.Embed] = {}
+    _signature: tuple = ()
+
+    def permission_tier(self) -> str:
+        """Which commands filter_commands lets through depends only on this"""
+        ctx = self.context
+        if ctx.guild is None:
+            return "dm"
+        return "admin" if ctx.permissions.administrator else "member"
+
+    def cached_embed(self, key: tuple) -> Optional[discord.Embed]:
+        bot = self.context.bot
+        # Holding the objects themselves keeps a reloaded cog from reusing an old id
+        signature = (tuple(bot.cogs.values()), frozenset(bot.commands))
+        if signature != CustomHelpCommand._signature:
+            CustomHelpCommand._embeds.clear()
+            CustomHelpCommand._signature = signature
+        return CustomHelpCommand._embeds.get(key)
+
+    async def send_cached(self, key: tuple, render) -> None:
+        embed = self.cached_embed(key)
+        if embed is None:
+            embed = CustomHelpCommand._embeds[key] = await render()
+        channel = self.get_destination()
+        await channel.send(embed=embed)
+
     async def send_bot_help(self, mapping):
+        await self.send_cached(("bot", self.permission_tier()), lambda: self.render_bot_help(mapping))
+
+    async def render_bot_help(self, mapping) -> discord.Embed:
         embed = discord.Embed(
             title="📚 THU Discord Bot Hilfe",
             description="Hier sind alle verfügbaren Befehle:",
@@ -26,10 +59,12 @@ class CustomHelpCommand(commands.HelpCommand):
                     )
 
         embed.set_footer(text=f"Nutze {Config.PREFIX}help <Befehl> für detaillierte Informationen zu einem Befehl.")
-        channel = self.get_destination()
-        await channel.send(embed=embed)
+        return embed
 
     async def send_command_help(self, command):
+        await self.send_cached(("command", command.qualified_name), lambda: self.render_command_help(command))
+
+    async def render_command_help(self, command) -> discord.Embed:
         embed = discord.Embed(
             title=f"Hilfe: {command.name}",
             description=command.help or "Keine detaillierte Beschreibung verfügbar.",
@@ -48,11 +83,12 @@ class CustomHelpCommand(commands.HelpCommand):
             value=f"`{Config.PREFIX}{command.name} {command.signature}`",
             inline=False
         )
-        
-        channel = self.get_destination()
-        await channel.send(embed=embed)
+        return embed
 
     async def send_cog_help(self, cog):
+        await self.send_cached(("cog", cog.qualified_name, self.permission_tier()), lambda: self.render_cog_help(cog))
+
+    async def render_cog_help(self, cog) -> discord.Embed:
         embed = discord.Embed(
             title=f"{cog.qualified_name} Befehle",
             description=cog.description or "Keine Beschreibung verfügbar.",
@@ -66,9 +102,7 @@ class CustomHelpCommand(commands.HelpCommand):
                 value=command.brief or "Keine kurze Beschreibung verfügbar.",
                 inline=False
             )
-            
-        channel = self.get_destination()
-        await channel.send(embed=embed)
+        return embed
 
     # This is called when a help command fails
     async def send_error_message(self, error):
@@ -0,0 +1,132 @@
+import atexit
+import copy
+import json
+import logging
+import os
+import queue
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from typing import Optional
+from cogs.email_verification.config import Config
+
+TEXT_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+class JsonLinesFormatter(logging.Formatter):
+    """One JSON object per record"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'time': datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+            'process': record.process,
+        }
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry['exception'] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False)
+
+class BoundedQueueHandler(QueueHandler):
+    """QueueHandler that never lets a full queue stall the caller for long.
+
+    When the queue is full, records below WARNING are dropped right away.
+    WARNING and above wait up to `block_timeout` seconds for room under the
+    "block" policy and are dropped immediately under "drop". The number of
+    dropped records is logged once the queue has room again.
+    """
+
+    def __init__(self, log_queue: queue.Queue, policy: str = "block", block_timeout: float = 0.5):
+        if policy not in ("block", "drop"):
+            raise ValueError(f"Unknown log queue policy: {policy}")
+        super().__init__(log_queue)
+        self.policy = policy
+        self.block_timeout = block_timeout
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Merge args and render the traceback here, but leave the layout to
+        # the formatters of the listener's handlers
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            if record.levelno < logging.WARNING or self.policy == "drop":
+                self.dropped += 1
+                return
+            try:
+                self.queue.put(record, timeout=self.block_timeout)
+            except queue.Full:
+                self.dropped += 1
+                return
+        if self.dropped:
+            dropped, self.dropped = self.dropped, 0
+            try:
+                self.queue.put_nowait(logging.makeLogRecord({
+                    'name': 'logging', 'levelno': logging.WARNING, 'levelname': 'WARNING',
+                    'msg': f"Dropped {dropped} log records, the log queue was full",
+                }))
+            except queue.Full:
+                self.dropped += dropped
+
+class DrainingQueueListener(QueueListener):
+    """QueueListener whose stop() waits for room instead of failing on a full queue"""
+
+    def enqueue_sentinel(self) -> None:
+        self.queue.put(self._sentinel)
+
+def setup_logging(filename: str = "bot.log") -> QueueListener:
+    """Send all logging through a queue to a background writer thread.
+
+    File rotation and console output happen on the listener thread, so a
+    slow disk cannot stall the event loop. The listener is stopped at exit,
+    which writes out everything still queued.
+    """
+    if not os.path.exists("./Logs"):
+        os.makedirs("./Logs")
+
+    if Config.LOG_FORMAT == "json":
+        formatter = JsonLinesFormatter()
+    elif Config.LOG_FORMAT == "text":
+        formatter = logging.Formatter(TEXT_FORMAT)
+    else:
+        raise ValueError(f"Unknown log format: {Config.LOG_FORMAT}")
+
+    file_handler = RotatingFileHandler(
+        f"./Logs/{filename}",
+        maxBytes=1024*1024,
+        backupCount=5,
+        encoding='utf-8',
+    )
+    stream_handler = logging.StreamHandler()
+    for handler in (file_handler, stream_handler):
+        handler.setFormatter(formatter)
+
+    log_queue = queue.Queue(Config.LOG_QUEUE_SIZE)
+    listener = DrainingQueueListener(log_queue, file_handler, stream_handler, respect_handler_level=True)
+    listener.start()
+    atexit.register(stop_logging, listener)
+
+    root = logging.getLogger()
+    root.setLevel(logging.INFO)
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    root.addHandler(BoundedQueueHandler(log_queue, Config.LOG_QUEUE_POLICY, Config.LOG_QUEUE_BLOCK_TIMEOUT))
+    return listener
+
+def stop_logging(listener: Optional[QueueListener]) -> None:
+    """Write out queued records and close the log files"""
+    if listener is None or listener._thread is None:
+        return
+    listener.stop()
+    for handler in listener.handlers:
+        handler.close()
@@ -1,99 +1,220 @@
 import discord
 from discord.ext import commands
-from dotenv import load_dotenv
+import hashlib
+import json
 import os
 import logging
-from logging.handlers import RotatingFileHandler
+import time
+import multiprocessing
+from typing import Optional
 from cogs.email_verification.config import Config
+from logging_config import setup_logging, stop_logging
 
-if not os.path.exists("./Logs"):
-    os.makedirs("./Logs")
-
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        RotatingFileHandler(
-            "./Logs/bot.log",
-            maxBytes=1024*1024,
-            backupCount=5,
-            encoding='utf-8',
-        ),
-        logging.StreamHandler()
-    ]
+logger = logging.getLogger('bot')
+
+EXTENSIONS = (
+    "cogs.email_verification",
+    "cogs.help",
 )
 
-logger = logging.getLogger('bot')
+# Seconds a bot process gets on top of the mail drain to flush logs and close
+SHUTDOWN_MARGIN = 15
+
+def build_intents() -> discord.Intents:
+    """Gateway intents for the configured INTENTS_PROFILE"""
+    if Config.INTENTS_PROFILE == "all":
+        return discord.Intents.all()
+    if Config.INTENTS_PROFILE != "minimal":
+        raise ValueError(f"Unknown intents profile: {Config.INTENTS_PROFILE}")
+
+    # Guilds for the guild/role cache, messages for prefix commands in DMs
+    # and admin commands in the server. Members are fetched on demand unless
+    # the members intent is explicitly enabled.
+    intents = discord.Intents.none()
+    intents.guilds = True
+    intents.guild_messages = True
+    intents.dm_messages = True
+    intents.message_content = True
+    intents.members = Config.MEMBERS_INTENT
+    return intents
 
-class Bot(commands.Bot):
-    def __init__(self):
+class Bot(commands.AutoShardedBot):
+    def __init__(self, shard_ids: Optional[list[int]] = None, shard_count: Optional[int] = None):
+        intents = build_intents()
         super().__init__(
             command_prefix=Config.PREFIX,
-            intents=discord.Intents.all(),
-            help_command=None
+            intents=intents,
+            help_command=None,
+            chunk_guilds_at_startup=Config.INTENTS_PROFILE == "all",
+            member_cache_flags=discord.MemberCacheFlags.from_intents(intents),
+            shard_ids=shard_ids,
+            shard_count=shard_count,
+            # Sent with IDENTIFY, so it survives reconnects without a change_presence call
+            activity=discord.Activity(
+                type=discord.ActivityType.watching,
+                name=f"{Config.PREFIX}help"
+            )
         )
+        self._created = time.perf_counter()
+        self._startup: dict[str, float] = {}
+        self._setup_done: float = self._created
+        self._ready_at: Optional[float] = None
         self.logger = logger
+        self.logger.info(f"Using {Config.INTENTS_PROFILE} intents profile (members intent: {intents.members})")
+        if shard_ids is not None:
+            self.logger.info(f"Process {Config.PROCESS_INDEX} runs shards {shard_ids} of {shard_count}")
 
     async def setup_hook(self):
+        # Runs once after login, before the gateway connects; on_ready
+        # fires again on every reconnect, so nothing one-time belongs there.
+        started = time.perf_counter()
+        self._startup['login'] = started - self._created
         self.logger.info("Loading cogs...")
-        
-        # Load email verification cog first
-        try:
-            await self.load_extension("cogs.email_verification")
-            self.logger.info(f"Loaded email verification cog with commands: {[cmd.name for cmd in self.commands]}")
-        except Exception as e:
-            self.logger.error(f"Failed to load email verification cog: {e}", exc_info=True)
-
-        # Load other cogs
-        for file in os.listdir("./cogs"):
-            if file.endswith(".py") and not file.startswith("__"):
-                try:
-                    name = file[:-3]
-                    if name != "verify":  # Skip if it's not the email verification cog
-                        await self.load_extension(f"cogs.{name}")
-                        self.logger.info(f"Loaded cog: {name}")
-                except Exception as e:
-                    self.logger.error(f"Failed to load cog {file}: {e}", exc_info=True)
-
-    async def on_ready(self):
-        self.logger.info(f"{self.user.name} is ready")
-        try:
-            synced = await self.tree.sync()
-            self.logger.info(f"Synced {len(synced)} commands")
-        except Exception as e:
-            self.logger.error(f"Failed to sync commands: {e}", exc_info=True)
+        for extension in EXTENSIONS:
+            try:
+                await self.load_extension(extension)
+                self.logger.info(f"Loaded cog: {extension}")
+            except Exception as e:
+                self.logger.error(f"Failed to load cog {extension}: {e}", exc_info=True)
+        loaded = time.perf_counter()
+        self._startup['extensions'] = loaded - started
 
         # Log all available commands
         self.logger.info("Available commands:")
         for cmd in self.commands:
             self.logger.info(f"- {cmd.name}: {cmd.help}")
 
-        await self.change_presence(
-            activity=discord.Activity(
-                type=discord.ActivityType.watching,
-                name=f"{self.command_prefix}help"
-            )
-        )
+        if Config.PROCESS_INDEX == 0:
+            try:
+                await self.sync_commands()
+            except Exception as e:
+                self.logger.error(f"Failed to sync commands: {e}", exc_info=True)
+        self._setup_done = time.perf_counter()
+        self._startup['command_sync'] = self._setup_done - loaded
 
-def main():
-    # Load environment variables
-    logger.info(f"Current working directory: {os.getcwd()}")
-    logger.info(f".env file exists: {os.path.exists('.env')}")
-    load_dotenv(verbose=True)
+    def command_tree_hash(self) -> str:
+        """Fingerprint of the application commands as they would be sent to Discord"""
+        commands_payload = [cmd.to_dict(self.tree) for cmd in self.tree.get_commands()]
+        commands_payload.sort(key=lambda cmd: (cmd.get('type', 1), cmd['name']))
+        payload = json.dumps({'application_id': self.application_id, 'commands': commands_payload},
+                             sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode()).hexdigest()
 
-    # Get token
-    token = str(os.getenv("TOKEN"))
-    if not token or not token.strip():
-        raise ValueError("No valid token found in environment variables")
+    async def sync_commands(self) -> None:
+        """Sync the command tree, unless it is unchanged since the last sync"""
+        digest = self.command_tree_hash()
+        try:
+            with open(Config.COMMAND_TREE_HASH_PATH, encoding='utf-8') as f:
+                if f.read().strip() == digest:
+                    self.logger.info("Command tree unchanged, skipping sync")
+                    return
+        except FileNotFoundError:
+            pass
 
+        synced = await self.tree.sync()
+        self.logger.info(f"Synced {len(synced)} commands")
+        directory = os.path.dirname(Config.COMMAND_TREE_HASH_PATH)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(Config.COMMAND_TREE_HASH_PATH, 'w', encoding='utf-8') as f:
+            f.write(digest)
+
+    async def on_ready(self):
+        self.logger.info(f"{self.user.name} is ready")
+        if self._ready_at is not None:
+            return
+        self._ready_at = time.perf_counter()
+        self._startup['gateway'] = self._ready_at - self._setup_done
+        phases = ", ".join(f"{name} {seconds:.2f}s" for name, seconds in self._startup.items())
+        self.logger.info(f"Startup took {self._ready_at - self._created:.2f}s ({phases})")
+
+def run_bot(token: str, shard_ids: Optional[list[int]] = None, shard_count: Optional[int] = None):
     try:
         # Initialize and run bot
-        bot = Bot()
-        bot.run(token)
+        bot = Bot(shard_ids, shard_count)
+        # Library logs go through the root logger's queue like our own
+        bot.run(token, log_handler=None)
     except discord.errors.LoginFailure as e:
         logger.error(f"Failed to login: {e}")
     except Exception as e:
         logger.error(f"An error occurred: {e}", exc_info=True)
 
+def run_shard_process(token: str, shard_ids: list[int], shard_count: int):
+    """Entry point of one launcher child, Config is read from the environment it was spawned with"""
+    listener = setup_logging(f"bot-{Config.PROCESS_INDEX}.log")
+    try:
+        run_bot(token, shard_ids, shard_count)
+    finally:
+        stop_logging(listener)
+
+def launch_processes(token: str):
+    """Run BOT_PROCESSES bot processes, each with its share of the shards.
+
+    Shards are dealt out round-robin, so process 0 holds shard 0, which
+    receives all DMs. The processes share pending verifications and rate
+    limits through the sqlite state backend.
+    """
+    processes = Config.BOT_PROCESSES
+    shard_count = Config.SHARD_COUNT or processes
+    if Config.STATE_BACKEND != "sqlite":
+        raise ValueError("Running several bot processes needs STATE_BACKEND=sqlite")
+    if shard_count < processes:
+        raise ValueError(f"SHARD_COUNT ({shard_count}) must be at least BOT_PROCESSES ({processes})")
+
+    # Spawned rather than forked, so every child gets a fresh Config and event loop
+    context = multiprocessing.get_context("spawn")
+    children = []
+    for index in range(processes):
+        os.environ['PROCESS_INDEX'] = str(index)
+        shard_ids = list(range(index, shard_count, processes))
+        child = context.Process(
+            target=run_shard_process,
+            args=(token, shard_ids, shard_count),
+            name=f"bot-{index}"
+        )
+        child.start()
+        children.append(child)
+        logger.info(f"Started bot process {index} (pid {child.pid}) with shards {shard_ids}")
+
+    try:
+        for child in children:
+            child.join()
+    except KeyboardInterrupt:
+        # The children got the SIGINT as well and are closing; let them drain mail and flush logs
+        logger.info("Stopping bot processes...")
+        deadline = time.monotonic() + Config.EMAIL_SHUTDOWN_TIMEOUT + SHUTDOWN_MARGIN
+        try:
+            for child in children:
+                child.join(max(0.0, deadline - time.monotonic()))
+        except KeyboardInterrupt:
+            logger.warning("Interrupted again, terminating bot processes")
+        for child in children:
+            if child.is_alive():
+                logger.warning(f"Bot process {child.name} did not stop in time, terminating it")
+                child.terminate()
+        for child in children:
+            child.join()
+
+def main():
+    listener = setup_logging()
+    try:
+        # Load environment variables
+        logger.info(f"Current working directory: {os.getcwd()}")
+        # .env is loaded once, when Config is imported
+        logger.info(f".env file exists: {os.path.exists('.env')}")
+
+        # Get token
+        token = str(os.getenv("TOKEN"))
+        if not token or not token.strip():
+            raise ValueError("No valid token found in environment variables")
+
+        if Config.BOT_PROCESSES > 1:
+            launch_processes(token)
+        else:
+            run_bot(token, shard_count=Config.SHARD_COUNT or None)
+    finally:
+        # Write out everything still queued before the process exits
+        stop_logging(listener)
+
 if __name__ == "__main__":
     main()